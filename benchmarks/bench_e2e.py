@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Offline end-to-end benchmark: runs the real bot.py (fetch, filter, queue and post) against local stand-ins for the
+# RSS feeds, news sites, Bluesky PDS/chat and Gemini from e2e_fakes.py, in a throwaway working directory, and reports
+# the wall time, throughput and per-stage timings from the bot's own metrics. Nothing leaves the machine.
+#   python3 benchmarks/bench_e2e.py [--feeds N] [--items N] [--sites N] [--ai] [--batch N] [--runs N] [--json FILE]
+#   python3 benchmarks/bench_e2e.py --feed-latency 200 --pds-latency 50    # simulate slow servers (milliseconds)
+# Any other bot.py flags can be passed after --, e.g. `-- --profile`.
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+from e2e_fakes import ADMIN_DID, ADMIN_HANDLE, BAD_WORDS, BOT_HANDLE, CONVO_ID, FakeWorld  # noqa: E402
+from src.data import DatabaseManager  # noqa: E402
+
+# the stages reported, in pipeline order
+STAGES = ("chat", "fetch", "filter", "rank", "post")
+
+
+def write_workdir(workdir: str, world: FakeWorld, args: argparse.Namespace) -> None:
+    """Config files and database for a bot that talks only to the fake world."""
+    os.makedirs(os.path.join(workdir, "config"))
+    os.makedirs(os.path.join(workdir, "data"))
+    main_config = {
+        "bsky_handle": BOT_HANDLE,
+        "bsky_password": "bench-password",
+        "admin_bsky_handle": ADMIN_HANDLE,
+        "pds_url": world.base_url,
+        "log_level": "INFO",
+        "delay_between_posts_in_seconds": 0,
+        "min_delay_between_posts_in_seconds": 0,
+        "posts_per_batch": args.batch,
+        "max_articles_per_feed": args.items,
+        "max_article_age_days": 7,
+        "filter_type": "ai" if args.ai else "keyword",
+        "gemini_api_key": "bench-key" if args.ai else "",
+        "gemini_model": "bench-model",
+        "gemini_base_url": world.base_url,
+        "ai_summary_prompt": "Summarize: ",
+        "metrics_summary_file": "data/metrics.jsonl",
+    }
+    feeds = {
+        "rss_feeds": {f"feed{i}": {"name": f"Bench feed {i}", "url": f"{world.base_url}/feeds/{i}.xml", "tag": f"Feed{i}"}
+                      for i in range(args.feeds)},
+        "html_sources": {f"site{i}": {"name": f"Bench site {i}", "url": f"{world.base_url}/site/{i}/", "tag": f"Site{i}"}
+                         for i in range(args.sites)},
+    }
+    filters = {"bad_words": [BAD_WORDS[0]], "super_bad_words": [BAD_WORDS[1]], "good_words": ["county"]}
+    tags = {"Schools": ["school", "board"], "Roads": ["road", "bridge"]}
+    for name, data in (("config", main_config), ("feeds", feeds), ("filter", filters), ("tags", tags)):
+        with open(os.path.join(workdir, "config", f"{name}.yml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(data, f)
+
+    # the admin chat has already been set up, so the command check is a single getLog call
+    db = DatabaseManager(Path(workdir) / "data" / "database.sqlite")
+    db.set_states({"chat_log_cursor": "0", "chat_admin_convo_id": CONVO_ID, "chat_admin_handle": ADMIN_HANDLE,
+                   "chat_admin_did": ADMIN_DID})
+
+
+def run_once(args: argparse.Namespace, bot_args: list[str]) -> dict:
+    world = FakeWorld(feeds=args.feeds, items_per_feed=args.items, sites=args.sites, articles_per_site=args.items,
+                      bad_ratio=args.bad_ratio, feed_latency=args.feed_latency / 1000,
+                      pds_latency=args.pds_latency / 1000, llm_latency=args.llm_latency / 1000)
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    world.start()
+    try:
+        write_workdir(workdir, world, args)
+        # newspaper keeps its article cache under the temp dir, keep it inside the throwaway one too
+        env = dict(os.environ, TMPDIR=workdir)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(REPO_ROOT, "bot.py"), *bot_args], cwd=workdir, env=env,
+                                capture_output=True, text=True, timeout=args.timeout)
+        wall = time.perf_counter() - start
+        if result.returncode != 0:
+            tail = "\n".join(result.stderr.strip().splitlines()[-5:])
+            raise RuntimeError(f"bot.py exited with {result.returncode}:\n{tail}")
+        with open(os.path.join(workdir, "data", "metrics.jsonl"), encoding="utf-8") as f:
+            summary = json.loads(f.readlines()[-1])
+        return {"wall_seconds": wall, "metrics": summary, "requests": dict(world.requests),
+                "records_created": world.records_created}
+    finally:
+        world.stop()
+        if args.keep:
+            print(f"kept working directory {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def counter(summary: dict, name: str) -> float:
+    return summary["counters"].get(name, 0)
+
+
+def histogram(summary: dict, name: str) -> dict:
+    return summary["histograms"].get(name, {})
+
+
+def report(runs: list[dict]) -> dict:
+    walls = [run["wall_seconds"] for run in runs]
+    last = runs[-1]
+    metrics = last["metrics"]
+    posted = last["records_created"]
+    wall = statistics.median(walls)
+    result = {
+        "runs": len(runs),
+        "wall_seconds_median": round(wall, 3),
+        "wall_seconds_min": round(min(walls), 3),
+        "articles_fetched": counter(metrics, 'articles_total{step="fetched"}'),
+        "articles_queued": counter(metrics, 'articles_total{step="queued"}'),
+        "posts_created": posted,
+        "posts_per_second": round(posted / wall, 2) if wall else 0,
+        "stages": {stage: histogram(metrics, f'stage_seconds{{stage="{stage}"}}').get("sum", 0) for stage in STAGES},
+        "requests": last["requests"],
+    }
+    print(f"{len(runs)} run(s): {result['wall_seconds_median']:.2f}s median wall time "
+          f"(min {result['wall_seconds_min']:.2f}s), {result['articles_fetched']:.0f} fetched, "
+          f"{result['articles_queued']:.0f} queued, {posted} posted ({result['posts_per_second']} posts/s)")
+    for stage, seconds in result["stages"].items():
+        print(f"    {stage:<8}{seconds:8.3f} s")
+    for name in ("fetch_seconds", "parse_seconds", "db_lookup_seconds", "llm_request_seconds", "image_upload_seconds",
+                 "post_seconds"):
+        series = {key: value for key, value in metrics["histograms"].items() if key.split("{")[0] == name}
+        if series:
+            count = sum(value["count"] for value in series.values())
+            total = sum(value["sum"] for value in series.values())
+            p95 = max(value["p95"] for value in series.values())
+            print(f"    {name:<22}{count:6d} x  mean {1000 * total / count:8.1f} ms  p95 {1000 * p95:8.1f} ms")
+    print("    requests: " + ", ".join(f"{name} {count}" for name, count in sorted(result["requests"].items())))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of a full bot.py run")
+    parser.add_argument("--feeds", type=int, default=10, help="number of RSS feeds")
+    parser.add_argument("--items", type=int, default=20, help="items per feed (and articles per site)")
+    parser.add_argument("--sites", type=int, default=0, help="number of HTML news sites (scraped with newspaper)")
+    parser.add_argument("--bad-ratio", type=float, default=0.1, help="share of headlines with a filtered word")
+    parser.add_argument("--feed-latency", type=float, default=0, help="added latency of feeds and sites, in ms")
+    parser.add_argument("--pds-latency", type=float, default=0, help="added latency of the PDS, in ms")
+    parser.add_argument("--llm-latency", type=float, default=0, help="added latency of Gemini, in ms")
+    parser.add_argument("--ai", action="store_true", help="use the AI filter and summaries (against the fake Gemini)")
+    parser.add_argument("--batch", type=int, default=1, help="posts_per_batch")
+    parser.add_argument("--runs", type=int, default=3, help="cold runs, each in a fresh working directory")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a run is killed")
+    parser.add_argument("--keep", action="store_true", help="keep the working directories for inspection")
+    parser.add_argument("--json", help="append the results as a JSON line to this file")
+    args, bot_args = parser.parse_known_args()
+    bot_args = [arg for arg in bot_args if arg != "--"]
+
+    try:
+        runs = [run_once(args, bot_args) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    result = report(runs)
+    if args.json:
+        result["options"] = {key: value for key, value in vars(args).items() if key not in ("json", "keep")}
+        result["bot_args"] = bot_args
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Feed parsing: src.fastfeed's streaming parser vs feedparser, parse time and peak traced memory, on synthetic feeds
+# shaped like big newspaper outbound feeds (full article HTML in content:encoded, media tags, categories) and on any
+# saved feed files given.
+#   python3 benchmarks/bench_feed_parser.py [--items 50 500 2000] [--repeat 5] [saved-feed.xml ...]
+import argparse
+import email.utils
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import src.fastfeed as fastfeed
+
+WORDS = ("council", "school", "bridge", "budget", "festival", "police", "library", "park", "river", "county",
+         "township", "mayor", "election", "road", "hospital", "farm", "market", "museum", "fire", "water")
+
+
+def synthetic_feed(items: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    now = time.time()
+    parts = []
+    for i in range(items):
+        link = f"https://news.example.com/{2026 - i // 500}/01/story-{i}-{'-'.join(rng.sample(WORDS, 5))}.html"
+        paragraphs = "".join(f"<p>{' '.join(rng.choices(WORDS, k=70))}.</p>" for _ in range(8))
+        parts.append(
+            f"<item><title>{' '.join(rng.sample(WORDS, 7)).capitalize()} &amp; more</title><link>{link}</link>"
+            f'<guid isPermaLink="true">{link}</guid><dc:creator>Staff writer {i % 17}</dc:creator>'
+            f"<description><![CDATA[<p>{' '.join(rng.choices(WORDS, k=45))}.</p>]]></description>"
+            f"<content:encoded><![CDATA[{paragraphs}]]></content:encoded>"
+            f"<pubDate>{email.utils.formatdate(now - i * 900, usegmt=True)}</pubDate>"
+            + "".join(f"<category>{word}</category>" for word in rng.sample(WORDS, 4))
+            + f'<media:content url="https://img.example.com/{i}.jpg" medium="image" width="1200" height="800">'
+            f"<media:credit>Photographer</media:credit></media:content>"
+            f'<enclosure url="https://img.example.com/{i}.jpg" type="image/jpeg" length="123456"/></item>')
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" '
+            'xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+            'xmlns:media="http://search.yahoo.com/mrss/"><channel><title>Example News</title>'
+            "<link>https://news.example.com/</link><description>Latest stories</description>"
+            f"{''.join(parts)}</channel></rss>").encode()
+
+
+def measure(parse, content: bytes, repeat: int) -> tuple[float, float, int]:
+    """Best parse time in seconds, peak traced memory in MiB, and the number of entries read."""
+    entries = parse(content)
+    seconds = min(timeit.repeat(lambda: parse(content), number=1, repeat=repeat))
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast feed parser with feedparser")
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 500, 2000], help="entries per synthetic feed")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per parser, the best is reported")
+    parser.add_argument("files", nargs="*", help="saved feeds to parse as well")
+    args = parser.parse_args()
+
+    parsers = {"fastfeed": lambda content: fastfeed.parse_feed(content) or []}
+    try:
+        import feedparser
+        parsers["feedparser"] = lambda content: feedparser.parse(content).entries
+    except ImportError:
+        print("feedparser is not installed, timing the fast parser only")
+
+    feeds = [(f"synthetic, {items} items", synthetic_feed(items)) for items in args.items]
+    for path in args.files:
+        with open(path, "rb") as f:
+            feeds.append((os.path.basename(path), f.read()))
+
+    print(f"{'feed':<26}{'size':>9}  {'parser':<11}{'entries':>8}{'time':>11}{'peak memory':>14}")
+    for name, content in feeds:
+        if fastfeed.parse_feed(content) is None:
+            print(f"{name:<26} is not handled by the fast parser, the bot would use feedparser for it")
+        results = {}
+        for parser_name, parse in parsers.items():
+            seconds, peak, count = measure(parse, content, args.repeat)
+            results[parser_name] = seconds
+            print(f"{name:<26}{len(content) / 1024:8.0f}K  {parser_name:<11}{count:>8}{seconds * 1000:9.1f}ms"
+                  f"{peak:11.1f}MiB")
+        if len(results) == 2 and results["fastfeed"]:
+            print(f"{'':<26}{'':>9}  {'speedup':<11}{'':>8}{results['feedparser'] / results['fastfeed']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
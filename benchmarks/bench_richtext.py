@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Microbenchmark: single-pass facet extraction and text cleanup in src.richtext vs the previous per-type regex passes.
+#   python3 benchmarks/bench_richtext.py [iterations]
+import html
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import src.richtext as richtext
+
+
+# The previous implementation: three uncompiled passes over three separate encodings of the text
+def legacy_parse_facets(post_text: str) -> list[tuple[str, int, int, str]]:
+    facets = []
+    url_regex = rb"[$|\W](https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*[-a-zA-Z0-9@%_\+~#//=])?)"
+    for m in re.finditer(url_regex, post_text.encode("UTF-8")):
+        facets.append(("link", m.start(1), m.end(1), m.group(1).decode("UTF-8")))
+    mention_regex = rb"[$|\W](@([a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)"
+    for m in re.finditer(mention_regex, post_text.encode("UTF-8")):
+        facets.append(("mention", m.start(1), m.end(1), m.group(1)[1:].decode("UTF-8")))
+    hashtag_regex = rb"[$|\W](#([a-zA-Z0-9_]{1,30}))"
+    for m in re.finditer(hashtag_regex, post_text.encode("UTF-8")):
+        facets.append(("tag", m.start(1), m.end(1), m.group(1).decode("UTF-8")))
+    return facets
+
+
+def legacy_format_post_text(headline: str, description: str) -> str:
+    text = html.unescape(f"{headline}\n\n{description}")
+
+    def _replace_a(m):
+        inner = re.sub(r'<[^>]+>', '', m.group(2) or '')
+        return f"{inner} ({m.group(1)})"
+    text = re.sub(r'(?i)<\s*a\b[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</\s*a\s*>', _replace_a, text)
+    text = re.sub(r'(?i)<\s*(br|p|div|li|tr|h[1-6])\b[^>]*>', '\n', text)
+    text = re.sub(r'(?i)</\s*(p|div|li|tr|h[1-6])\s*>', '', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = text.replace('\r', '')
+    text = re.sub(r'\n{3,}', '\n', text)
+    return re.sub(r'[ \t]+', ' ', text).strip()
+
+
+POST_TEXT = ("Harrisburg council approves budget — café owners react 🎉 via @pennlive.bsky.social "
+             "https://www.pennlive.com/news/2026/10/council-approves-budget.html #PennLive #DauphinCo ")
+HEADLINE = "Council &amp; mayor agree on <b>2027</b> budget"
+DESCRIPTION = ("<p>The <a href=\"https://example.com/budget\">proposed <i>budget</i></a> passed 5-2.</p>\r\n"
+               "<div>Residents   spoke\tfor two hours.</div><br/><ul><li>Taxes: flat</li><li>Parks: +3%</li></ul>"
+               "<h2>What's next</h2><p>Final vote in   November.</p>") * 3
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    legacy = sorted(legacy_parse_facets(POST_TEXT), key=lambda f: f[1])
+    current = [tuple(f) for f in richtext.find_facets(POST_TEXT)]
+    assert legacy == current, f"facet mismatch:\n{legacy}\n{current}"
+    assert legacy_format_post_text(HEADLINE, DESCRIPTION) == richtext.html_to_text(f"{HEADLINE}\n\n{DESCRIPTION}")
+
+    cases = [
+        ("facets", lambda: legacy_parse_facets(POST_TEXT), lambda: richtext.find_facets(POST_TEXT)),
+        ("format_post_text", lambda: legacy_format_post_text(HEADLINE, DESCRIPTION),
+         lambda: richtext.html_to_text(f"{HEADLINE}\n\n{DESCRIPTION}")),
+    ]
+    print(f"{'case':<18}{'legacy us/op':>14}{'richtext us/op':>16}{'speedup':>10}")
+    for name, legacy_fn, new_fn in cases:
+        legacy_time = min(timeit.repeat(legacy_fn, number=number, repeat=5)) / number * 1e6
+        new_time = min(timeit.repeat(new_fn, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<18}{legacy_time:>14.2f}{new_time:>16.2f}{legacy_time / new_time:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
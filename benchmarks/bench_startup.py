@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Cold-start import benchmark for the chat-only (--no-posts) and full-run paths, based on `python -X importtime`.
+#   python3 benchmarks/bench_startup.py [--runs N] [--top N] [--history FILE]
+# --history appends one JSON line per run of this script, so startup regressions can be tracked over time.
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# What each path imports: the modules bot.py loads up front plus the ones pulled in by the features it uses
+SCENARIOS = {
+    # bot.py --no-posts: config, Bluesky login and the chat command check
+    "chat-only": ["bot", "src.bsky_account", "src.bsky_chat_handler"],
+    # a full run with RSS and HTML sources, AI summaries/filtering and posting
+    "full-run": ["bot", "src.bsky_account", "src.bsky_chat_handler", "src.bsky_post_handler", "src.rsssource",
+                 "src.htmlsource", "src.aisummary", "src.aifilter", "src.keywordfilter", "feedparser", "google.genai"],
+}
+
+
+def measure(modules: list[str]) -> dict:
+    """Import modules in a fresh interpreter and return the import time in ms, in total and per direct import."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        raise RuntimeError(f"import failed: {error}")
+
+    cumulative = {}
+    total_us = 0
+    module_count = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        module_count += 1
+        total_us += self_us
+        # nesting is shown as two spaces per level; keep what the -c statement and its modules imported directly
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level <= 1:
+            cumulative[name.strip()] = max(cumulative.get(name.strip(), 0), cumulative_us)
+    return {"total_ms": total_us / 1000, "modules": module_count,
+            "top": {name: us / 1000 for name, us in cumulative.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per scenario, the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="how many of the slowest imports to list")
+    parser.add_argument("--history", help="append the results as a JSON line to this file")
+    args = parser.parse_args()
+
+    summary = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0]}
+    for scenario, modules in SCENARIOS.items():
+        try:
+            runs = [measure(modules) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{scenario}: {e}")
+            summary[scenario] = {"error": str(e)}
+            continue
+        median = statistics.median(run["total_ms"] for run in runs)
+        slowest = sorted(runs[-1]["top"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{scenario}: {median:.1f} ms median import time over {args.runs} runs ({runs[-1]['modules']} modules)")
+        for name, ms in slowest:
+            print(f"    {ms:8.1f} ms  {name}")
+        summary[scenario] = {"median_ms": round(median, 1), "modules": runs[-1]["modules"],
+                             "slowest": {name: round(ms, 1) for name, ms in slowest}}
+
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+if __name__ == "__main__":
+    main()
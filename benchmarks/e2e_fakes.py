@@ -0,0 +1,224 @@
+# Local stand-ins for everything the bot talks to, for the offline end-to-end benchmark (bench_e2e.py):
+# synthetic RSS feeds and news sites, a Bluesky PDS with the chat endpoints, and the Gemini API.
+# All of them run in one threaded HTTP server on 127.0.0.1 and count the requests they answer.
+import base64
+import collections
+import email.utils
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BOT_HANDLE = "bench-bot.test"
+BOT_DID = "did:plc:benchbot000000000000000"
+ADMIN_HANDLE = "bench-admin.test"
+ADMIN_DID = "did:plc:benchadmin0000000000000"
+CONVO_ID = "bench-convo"
+FAKE_CID = "bafyreie5737gdxlw5i64vzichcalba3z2v5n6icifvx5xytvske7mr3hpm"
+# stands in for every article image; the bot only downloads and uploads the bytes
+FAKE_JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + bytes(2048) + b"\xff\xd9"
+WORDS = ("council", "school", "bridge", "budget", "festival", "police", "library", "park", "river", "county", "township",
+         "mayor", "election", "road", "hospital", "farm", "market", "museum", "fire", "water", "board", "vote")
+# words the benchmark's filter.yml lists, so the filters have something to remove
+BAD_WORDS = ("celebrity", "horoscope")
+
+
+def _jwt(did: str, scope: str) -> str:
+    """An unsigned JWT with a far expiry; the client only reads its payload."""
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    now = int(time.time())
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part({'scope': scope, 'sub': did, 'iat': now, 'exp': now + 86400})}.c2ln"
+
+
+class FakeWorld:
+    def __init__(self, feeds: int, items_per_feed: int, sites: int, articles_per_site: int, bad_ratio: float,
+                 feed_latency: float, pds_latency: float, llm_latency: float, seed: int = 1):
+        self.feeds = feeds
+        self.items_per_feed = items_per_feed
+        self.sites = sites
+        self.articles_per_site = articles_per_site
+        self.bad_ratio = bad_ratio
+        self.feed_latency = feed_latency
+        self.pds_latency = pds_latency
+        self.llm_latency = llm_latency
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.requests: collections.Counter[str] = collections.Counter()
+        self.records_created = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name="fake-world", daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.requests[name] += 1
+
+    def add_records(self, records: int) -> None:
+        with self.lock:
+            self.records_created += records
+
+    # --- synthetic news -------------------------------------------------------------------------------------------
+
+    def headline(self, rng: random.Random) -> str:
+        words = rng.sample(WORDS, 5)
+        if rng.random() < self.bad_ratio:
+            words[rng.randrange(len(words))] = rng.choice(BAD_WORDS)
+        return " ".join(words).capitalize()
+
+    def rss(self, feed: int) -> bytes:
+        rng = random.Random(self.seed * 1000 + feed)
+        now = time.time()
+        items = []
+        for i in range(self.items_per_feed):
+            link = f"{self.base_url}/site/{feed}/news/2026/01/01/story-{feed}-{i}-local-report.html"
+            published = email.utils.formatdate(now - i * 1800, usegmt=True)
+            items.append(
+                f"<item><title>{self.headline(rng)}</title><link>{link}</link><guid>{link}</guid>"
+                f"<description>{' '.join(rng.choices(WORDS, k=40))}.</description><pubDate>{published}</pubDate>"
+                f'<enclosure url="{self.base_url}/images/{feed}-{i}.jpg" type="image/jpeg" length="{len(FAKE_JPEG)}"/>'
+                f"</item>")
+        return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Bench feed {feed}</title>'
+                f"<link>{self.base_url}/site/{feed}/</link><description>Synthetic feed</description>"
+                f"{''.join(items)}</channel></rss>").encode()
+
+    def site_index(self, site: int) -> bytes:
+        rng = random.Random(self.seed * 2000 + site)
+        links = "".join(
+            f'<li><a href="/site/{site}/news/2026/01/01/site-{site}-{i}-{"-".join(rng.sample(WORDS, 4))}.html">'
+            f"{self.headline(rng)}</a></li>" for i in range(self.articles_per_site))
+        return f"<html><head><title>Bench site {site}</title></head><body><ul>{links}</ul></body></html>".encode()
+
+    def article(self, path: str) -> bytes:
+        rng = random.Random(path)
+        paragraphs = "".join(f"<p>{' '.join(rng.choices(WORDS, k=60))}.</p>" for _ in range(6))
+        headline = self.headline(rng)
+        return (f'<html><head><title>{headline}</title><meta property="og:image" content="{self.base_url}/images/og.jpg">'
+                f'<meta name="description" content="{" ".join(rng.choices(WORDS, k=20))}">'
+                f'<meta property="article:published_time" content="{time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())}">'
+                f"</head><body><article><h1>{headline}</h1>{paragraphs}</article></body></html>").encode()
+
+    # --- Bluesky PDS and chat -------------------------------------------------------------------------------------
+
+    def session(self) -> dict:
+        return {"accessJwt": _jwt(BOT_DID, "com.atproto.access"), "refreshJwt": _jwt(BOT_DID, "com.atproto.refresh"),
+                "handle": BOT_HANDLE, "did": BOT_DID, "active": True}
+
+    def xrpc(self, method: str, nsid: str, params: dict, body: bytes) -> tuple[int, dict]:
+        data = {}
+        if body and method == "POST" and nsid != "com.atproto.repo.uploadBlob":
+            data = json.loads(body)
+        if nsid in ("com.atproto.server.createSession", "com.atproto.server.refreshSession"):
+            return 200, self.session()
+        if nsid == "com.atproto.server.getSession":
+            return 200, {"handle": BOT_HANDLE, "did": BOT_DID, "active": True}
+        if nsid == "app.bsky.actor.getProfile":
+            return 200, {"did": BOT_DID, "handle": BOT_HANDLE}
+        if nsid == "com.atproto.identity.resolveHandle":
+            return 200, {"did": ADMIN_DID if params.get("handle") == ADMIN_HANDLE else BOT_DID}
+        if nsid == "com.atproto.repo.uploadBlob":
+            return 200, {"blob": {"$type": "blob", "ref": {"$link": FAKE_CID}, "mimeType": "image/jpeg", "size": len(body)}}
+        if nsid == "com.atproto.repo.createRecord":
+            self.add_records(1)
+            return 200, {"uri": f"at://{BOT_DID}/app.bsky.feed.post/{time.time_ns()}", "cid": FAKE_CID}
+        if nsid == "com.atproto.repo.applyWrites":
+            writes = data.get("writes", [])
+            self.add_records(len(writes))
+            return 200, {"commit": {"cid": FAKE_CID, "rev": str(time.time_ns())},
+                         "results": [{"$type": "com.atproto.repo.applyWrites#createResult",
+                                      "uri": f"at://{BOT_DID}/app.bsky.feed.post/{time.time_ns()}{i}", "cid": FAKE_CID}
+                                     for i in range(len(writes))]}
+        if nsid == "chat.bsky.convo.getLog":
+            return 200, {"logs": [], "cursor": params.get("cursor") or "0"}
+        if nsid == "chat.bsky.convo.getConvoForMembers":
+            return 200, {"convo": {"id": CONVO_ID, "rev": "0", "members": [], "muted": False, "unreadCount": 0}}
+        if nsid == "chat.bsky.convo.getMessages":
+            return 200, {"messages": []}
+        return 501, {"error": "MethodNotImplemented", "message": f"{nsid} is not faked"}
+
+    # --- Gemini ---------------------------------------------------------------------------------------------------
+
+    def gemini(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        if method == "GET":
+            return 200, {"models": [{"name": "models/bench-model", "displayName": "Bench model"}]}
+        prompt = json.dumps(json.loads(body or b"{}"))
+        # the AI filter asks for a score, everything else is a summary request
+        text = "0.8" if "Rate the quality" in prompt else "Local officials announced changes residents will notice soon."
+        return 200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                     "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4,
+                                       "totalTokenCount": (len(prompt) + len(text)) // 4}}
+
+
+def _make_handler(world: FakeWorld) -> type[BaseHTTPRequestHandler]:
+    class FakeWorldHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.route("GET")
+
+        def do_POST(self):
+            self.route("POST")
+
+        def route(self, method: str) -> None:
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            path = url.path
+            if path.startswith("/xrpc/"):
+                nsid = path[len("/xrpc/"):]
+                world.count(nsid)
+                time.sleep(world.pds_latency)
+                status, payload = world.xrpc(method, nsid, {k: v[-1] for k, v in parse_qs(url.query).items()}, body)
+                headers = {}
+                if nsid in ("com.atproto.repo.createRecord", "com.atproto.repo.applyWrites"):
+                    # plenty of headroom, so the scheduler never waits
+                    headers = {"ratelimit-limit": "5000", "ratelimit-remaining": "4990",
+                               "ratelimit-reset": str(int(time.time()) + 3600), "ratelimit-policy": "5000;w=3600"}
+                self.send_json(status, payload, headers)
+            elif path.startswith("/v1beta/") or path.startswith("/v1/"):
+                world.count("gemini")
+                time.sleep(world.llm_latency)
+                self.send_json(*world.gemini(method, path, body))
+            elif path.startswith("/feeds/"):
+                world.count("feed")
+                time.sleep(world.feed_latency)
+                self.send(200, world.rss(int(path.rsplit("/", 1)[-1].split(".")[0])), "application/rss+xml")
+            elif path.startswith("/images/"):
+                world.count("image")
+                self.send(200, FAKE_JPEG, "image/jpeg")
+            elif path.startswith("/site/"):
+                world.count("site")
+                time.sleep(world.feed_latency)
+                parts = path.strip("/").split("/")
+                if len(parts) == 2:
+                    self.send(200, world.site_index(int(parts[1])), "text/html; charset=utf-8")
+                else:
+                    self.send(200, world.article(path), "text/html; charset=utf-8")
+            else:
+                world.count("not found")
+                self.send(404, b"not found", "text/plain")
+
+        def send_json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+            self.send(status, json.dumps(payload).encode(), "application/json", headers)
+
+        def send(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeWorldHandler
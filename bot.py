@@ -1,74 +1,277 @@
 #!/usr/bin/env python3
 import socket
 import time
-import src.htmlsource
+from contextlib import contextmanager
+from typing import Iterator
+import src.ranking
 import src.rsssource
+from src.circuitbreaker import SourceCircuitBreaker
+from src.keywordfilter import matches_super_bad_words
 from src.bsky_post import BskyPost
 from src.config import Config
+from src.data import DB_PATH, DatabaseManager
+from src.daemon import Daemon, Job
+from src.runbudget import RunBudget, run_lock
+
+# how often the daemon runs commands that came in over the control endpoint
+CONTROL_POLL_SECONDS = 1
 
 # Main function
 def main():
 	# bail on connections if we don't have anything in 20 seconds
     socket.setdefaulttimeout(20)
     config = Config() # loads config files and sets up database and api
+    argv = __import__('sys').argv
 
     config.logger.info(" LocalNewsBot is starting up...")
+    if "--profile" in argv or "--profile-memory" in argv:
+        from src.profiling import StageProfiler
+        config.profiler = StageProfiler(config.logger, cpu="--profile" in argv, memory="--profile-memory" in argv)
+    if "--latency-report" in argv:
+        print_latency_report(config, argv)
+        return
+    # the fetch and post halves may run at the same time, but never twice each
+    with run_lock(["fetch"] if "--fetch-only" in argv else ["post"] if "--post-only" in argv else ["fetch", "post"]) as locked:
+        if not locked:
+            config.logger.warning(" Another run is still in progress, exiting.")
+            return
+        if "--daemon" in argv:
+            run_daemon(config)
+            return
+        run_once(config, argv)
+
+# A single run: command check, then fetching and/or posting, within the run budget if there is one
+def run_once(config: Config, argv: list[str]):
+    if config.get_run_budget_seconds():
+        config.budget = RunBudget(config.get_run_budget_seconds(), config.get_run_budget_deadlines(), config.logger)
+    if "--record" in argv or "--replay" in argv:
+        start_cassette(config, argv)
     try:
-        config.get_bsky_account().get_chat_handler().check_for_commands()
-        if "--no-posts" not in __import__('sys').argv:
-            fetch_filter_and_post(config)
-        else:
+        with stage(config, "chat"):
+            config.get_bsky_account().get_chat_handler().check_for_commands()
+        if "--no-posts" in argv:
             config.logger.info(" Finished. (--no-posts flag detected)")
+        elif "--fetch-only" in argv:
+            fetch_filter_and_enqueue(config)
+        elif "--post-only" in argv:
+            post_from_outbox(config)
+        else:
+            fetch_filter_and_post(config)
         config.save_session()
     except Exception as e:
         config.logger.error(f"An error occurred: {e}")
         raise
+    finally:
+        if config.cassette:
+            config.cassette.uninstall()
+        config.export_metrics()
     
 
+# --latency-report [DAYS] prints how long articles took to get posted, per source
+def print_latency_report(config: Config, argv: list[str]):
+    from src.latency import DEFAULT_REPORT_DAYS, format_latency_report, latency_report
+    index = argv.index("--latency-report") + 1
+    days = float(argv[index]) if index < len(argv) and not argv[index].startswith("--") else DEFAULT_REPORT_DAYS
+    print(format_latency_report(latency_report(config.db, days)))
+
+# --record DIR saves every HTTP response of this run, --replay DIR [--replay-speed X] plays them back instead of going
+# to the network, against the database as it was when recording started
+def start_cassette(config: Config, argv: list[str]):
+    from src.cassette import Cassette
+    if "--record" in argv:
+        cassette = Cassette(argv[argv.index("--record") + 1], "record", config.logger)
+        cassette.snapshot_database(DB_PATH)
+    else:
+        speed = float(argv[argv.index("--replay-speed") + 1]) if "--replay-speed" in argv else 1.0
+        cassette = Cassette(argv[argv.index("--replay") + 1], "replay", config.logger, speed)
+        config.db = DatabaseManager(cassette.replay_database())
+    config.cassette = cassette
+    cassette.install()
+
+
+# Times a pipeline stage, and profiles it when running with --profile / --profile-memory
+@contextmanager
+def stage(config: Config, name: str) -> Iterator[None]:
+    with config.metrics.timer("stage_seconds", stage=name):
+        if config.profiler is None:
+            yield
+        else:
+            with config.profiler.stage(name):
+                yield
+
+# Keeps running, with fetching, posting and command checks each on their own interval
+def run_daemon(config: Config):
+    intervals = config.get_daemon_intervals()
+    daemon = Daemon(config, [
+        Job("chat command check", intervals["chat"], check_for_commands, min_interval=intervals["chat_min"],
+            between_stages=True),
+        Job("fetch and filter", intervals["fetch"], fetch_filter_and_enqueue),
+        Job("posting", intervals["post"], post_from_outbox),
+    ])
+    control = None
+    if config.get_control_port() and not config.get_control_token():
+        config.logger.error(" control_port is set but control_token is empty, not starting the control endpoint.")
+    elif config.get_control_port():
+        from src.control import ControlServer
+        control = ControlServer(config, daemon.stats)
+        daemon.jobs.append(Job("control commands", CONTROL_POLL_SECONDS, control.process_pending, between_stages=True))
+        control.start()
+    try:
+        daemon.run()
+    finally:
+        if control:
+            control.stop()
+
+def check_for_commands(config: Config) -> bool:
+    return config.get_bsky_account().get_chat_handler().check_for_commands()
+
 def fetch_filter_and_post(config: Config):
+    fetch_filter_and_enqueue(config)
+    post_from_outbox(config)
+
+# Fetch/filter side: everything that passes the filters goes into the outbox
+def fetch_filter_and_enqueue(config: Config):
     start_time = time.time()
     # Check all RSS and HTML feeds for articles that haven't been posted
-    articles = get_all_new_articles(config)
+    with stage(config, "fetch"):
+        articles = get_all_new_articles(config)
     if not articles:
         elapsed = time.time() - start_time
-        config.logger.info(f" Finished({elapsed:.2f}s): No new articles found.")
+        config.logger.info(f" Finished fetching({elapsed:.2f}s): No new articles found.")
         return
 
     # Filter articles
+    config.between_stages()
     total_fetched = len(articles)
-    articles = config.news_filter.filter(articles)
-    
-    if not articles:
+    with stage(config, "filter"):
+        news_filter = config.news_filter
+        with config.metrics.timer("filter_seconds", filter=type(news_filter).__name__):
+            articles = news_filter.filter(articles)
+    queued = config.db.enqueue_articles([(article.link, article.to_dict()) for article in articles])
+    config.db.record_articles_seen(
+        [(article.link, article.source_name, article.published_epoch) for article in articles],
+        start_time)
+    config.metrics.inc("articles_total", total_fetched, step="fetched")
+    config.metrics.inc("articles_total", total_fetched - len(articles), step="filtered_out")
+    config.metrics.inc("articles_total", queued, step="queued")
+    elapsed = time.time() - start_time
+    config.logger.info(f" Finished fetching({elapsed:.2f}s): Fetched: {total_fetched}, Filtered: {total_fetched - len(articles)}, Queued: {queued}")
+
+# Posting side: drains whatever is waiting in the outbox, including leftovers from earlier runs
+def post_from_outbox(config: Config):
+    start_time = time.time()
+    queued = [BskyPost.from_outbox(entry, config) for entry in config.db.get_outbox_entries()]
+    if not queued:
         elapsed = time.time() - start_time
-        config.logger.info(f" Finished({elapsed:.2f}s): No articles to post after filtering.")
+        config.logger.info(f" Finished posting({elapsed:.2f}s): No articles waiting to be posted.")
         return
-    
+
+    # most important stories first
+    config.between_stages()
+    with stage(config, "rank"):
+        articles = src.ranking.rank_articles(queued, config)
+    config.get_bsky_account().post_scheduler.start_run()
     config.logger.info(f" Posting {len(articles)} articles:")
-    post_all_articles(articles, config)
+    with stage(config, "post"):
+        posted = post_all_articles(articles, config)
     elapsed = time.time() - start_time
-    config.logger.info(f" Finished({elapsed:.2f}s): Fetched: {total_fetched}, Filtered: {total_fetched - len(articles)}, Posted: {len(articles)}")
+    config.logger.info(f" Finished posting({elapsed:.2f}s): Posted: {posted}, Still queued: {len(queued) - posted}")
 
 def get_all_new_articles(config: Config) -> list[BskyPost]:
         start_time = time.time()
         config.logger.info(" LocalNewsBot is checking for new articles...")
-        articles = src.rsssource.get_rss_feeds(config)
-        articles.extend(src.htmlsource.get_html_sources(config))
+        breaker = SourceCircuitBreaker(config)
+        articles = src.rsssource.get_rss_feeds(config, breaker)
+        if config.get_html_sources():
+            config.between_stages()
+            # newspaper (and with it nltk and lxml) is only loaded when there are HTML sources to scrape
+            import src.htmlsource
+            articles.extend(src.htmlsource.get_html_sources(config, breaker))
+        breaker.save()
+        config.logger.info(breaker.summary())
         if not articles:
             return []
         config.logger.info(f" Fetched {len(articles)} articles in {time.time() - start_time:.2f} seconds.")
         return articles
 
-def post_all_articles(articles: list[BskyPost], config: Config):
+# Posts outbox articles and returns how many were posted
+def post_all_articles(articles: list[BskyPost], config: Config) -> int:
+    already_posted = [article for article in articles if config.db.has_posted_article(article.link)]
+    if already_posted:
+        config.db.mark_outbox_posted([article.outbox_id for article in already_posted])
+    articles = [article for article in articles if article not in already_posted]
+    batch_size = config.get_posts_per_batch()
+    if batch_size > 1:
+        return post_articles_in_batches(articles, batch_size, config)
+
+    posted = 0
     for i, article in enumerate(articles):
-        if not config.db.has_posted_article(article.link):
-            # After posting, record the article as posted
-            article.post_to_bluesky()
-            config.db.record_posted_article(article.link)
-
-            if i < len(articles) - 1:
-                delay = config.get_delay_between_posts_seconds()
-                config.logger.info(f"   Waiting {delay} seconds before next post..")
-                time.sleep(delay)
+        if config.shutdown.is_set() or config.past_deadline("post"):
+            break
+        if is_newly_excluded(article, config):
+            continue
+        try:
+            article.prepare_post()
+            config.db.mark_outbox_prepared(article.outbox_id, article.post_text)
+            success = article.post_to_bluesky()
+            error = "post was not accepted"
+        except Exception as e:
+            config.logger.error(f"Error posting article {article.link}: {e}")
+            success, error = False, str(e)
+
+        # After posting, record the article as posted
+        config.metrics.inc("articles_total", step="posted" if success else "failed")
+        if success:
+            config.db.mark_outbox_posted([article.outbox_id])
+            posted += 1
+        elif config.db.mark_outbox_failed(article.outbox_id, error, config.get_outbox_max_retries()):
+            config.logger.warning(f"Giving up on article after {config.get_outbox_max_retries()} attempts: {article.headline}")
+
+        if i < len(articles) - 1:
+            config.get_bsky_account().post_scheduler.wait(len(articles) - i - 1)
+    return posted
+
+def post_articles_in_batches(articles: list[BskyPost], batch_size: int, config: Config) -> int:
+    posted = 0
+    for start in range(0, len(articles), batch_size):
+        if config.shutdown.is_set() or config.past_deadline("post"):
+            break
+        batch = [article for article in articles[start:start + batch_size] if not is_newly_excluded(article, config)]
+        if not batch:
+            continue
+        start_time = time.time()
+        try:
+            for article in batch:
+                article.prepare_post()
+                config.db.mark_outbox_prepared(article.outbox_id, article.post_text)
+            success = config.get_bsky_account().post_articles(batch)
+            error = "batch was not accepted"
+        except Exception as e:
+            config.logger.error(f"Error posting batch of {len(batch)} articles: {e}")
+            success, error = False, str(e)
+
+        config.metrics.inc("articles_total", len(batch), step="posted" if success else "failed")
+        if success:
+            config.db.mark_outbox_posted([article.outbox_id for article in batch])
+            config.logger.info(f"   Posted batch of {len(batch)} articles ({time.time() - start_time:.2f} seconds)")
+            posted += len(batch)
+        else:
+            for article in batch:
+                config.db.mark_outbox_failed(article.outbox_id, error, config.get_outbox_max_retries())
+
+        posts_left = max(len(articles) - start - batch_size, 0)
+        if posts_left > 0:
+            config.get_bsky_account().post_scheduler.wait(posts_left, min(batch_size, posts_left))
+    return posted
+
+# A super bad word added (e.g. by an admin command) after an article was queued still keeps it from being posted
+def is_newly_excluded(article: BskyPost, config: Config) -> bool:
+    if not matches_super_bad_words(article, config):
+        return False
+    config.logger.info(f"   Not posting, now matches the super bad words: {article.headline}({article.source_name})")
+    config.db.mark_outbox_excluded(article.outbox_id)
+    config.metrics.inc("articles_total", step="excluded_before_posting")
+    return True
 
 if __name__ == "__main__":
     main()
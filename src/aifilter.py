@@ -1,8 +1,9 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
+from src.metrics import record_llm_usage
 from src.newsfilter import NewsFilter
-from google import genai
 if TYPE_CHECKING:
+    from google import genai
     from bsky_post import BskyPost
     from src.config import Config
 
@@ -24,7 +25,9 @@ class AIFilter(NewsFilter):
             return
         
         try:
-            self.client = genai.Client(api_key=api_key)
+            # imported here so runs without a Gemini key never load google-genai
+            from google import genai
+            self.client = genai.Client(api_key=api_key, http_options=self.config.get_gemini_http_options())
             # Test the API key with a simple call
             self.client.models.list()
             self.enabled = True
@@ -69,7 +72,11 @@ class AIFilter(NewsFilter):
         removed_articles = []
         
         for article in working_articles:
+            # articles that are neither queued nor excluded are fetched and rated again next run
+            if self.config.past_deadline("filter"):
+                break
             score = self._score_article(article)
+            article.ai_score = score
             if score >= quality_threshold:
                 self.logger.debug(f"Article passed AI filter (score: {score:.2f}): {article.headline}")
                 scored_articles.append(article)
@@ -124,10 +131,13 @@ Description: {article.description[:500]}
 
 Response: Provide ONLY a decimal number between 0 and 1 (e.g., 0.75). No explanation needed."""
 
-            response = self.client.models.generate_content(
-                model=self.config.get_gemini_model(),
-                contents=prompt
-            )
+            metrics = self.config.metrics
+            with metrics.timer("llm_request_seconds", purpose="filter"):
+                response = self.client.models.generate_content(
+                    model=self.config.get_gemini_model(),
+                    contents=prompt
+                )
+            record_llm_usage(metrics, "filter", response)
             
             if response and response.text:
                 try:
@@ -142,5 +152,6 @@ Response: Provide ONLY a decimal number between 0 and 1 (e.g., 0.75). No explana
                 return 0.5
                 
         except Exception as e:
+            self.config.metrics.inc("llm_errors_total", purpose="filter")
             self.logger.error(f"Error scoring article '{article.headline}': {e}")
             return 0.5
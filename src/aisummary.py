@@ -1,6 +1,6 @@
 from __future__ import annotations
-from google import genai
 from typing import TYPE_CHECKING
+from src.metrics import record_llm_usage
 if TYPE_CHECKING:
     from src.config import Config
     from src.bsky_post import BskyPost
@@ -22,7 +22,9 @@ class Summarizer:
             return
         
         try:
-            self.client = genai.Client(api_key=api_key)
+            # imported here so runs without a Gemini key never load google-genai
+            from google import genai
+            self.client = genai.Client(api_key=api_key, http_options=self.config.get_gemini_http_options())
             # Test the API key with a simple call
             self.client.models.list()
             self.enabled = True
@@ -40,14 +42,18 @@ class Summarizer:
         if not self.enabled:
             return ""
         
+        metrics = self.config.metrics
         try:
             article_content = f"Headline: {post.headline}\n\nDescription: {post.description}"
-            response = self.client.models.generate_content(
-                model=self.config.get_gemini_model(),
-                contents=self.config.get_ai_summary_prompt() + article_content,
-            )
+            with metrics.timer("llm_request_seconds", purpose="summary"):
+                response = self.client.models.generate_content(
+                    model=self.config.get_gemini_model(),
+                    contents=self.config.get_ai_summary_prompt() + article_content,
+                )
+            record_llm_usage(metrics, "summary", response)
             return response.text if response and response.text else ""
         except Exception as e:
+            metrics.inc("llm_errors_total", purpose="summary")
             self.logger.error(f"Error generating summary for {post.headline}: {e}")
             return ""
     
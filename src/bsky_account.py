@@ -1,18 +1,30 @@
 from __future__ import annotations
-import sys
-from typing import Any, Dict
 from atproto import Client
 from atproto.exceptions import AtProtocolError
-import requests
-import urllib3
-import json
 
 from .bsky_chat_handler import BskyChatHandler
-from .bsky_post_handler import BskyPostHandler
+from .ratelimit import PostScheduler, WRITE_ENDPOINTS
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from src.config import Config
     from src.bsky_post import BskyPost
+    from .bsky_post_handler import BskyPostHandler
+
+# Client that reports the rate-limit headers of every post write to a PostScheduler
+class RateLimitedClient(Client):
+    post_scheduler: PostScheduler | None = None
+
+    def _invoke(self, invoke_type, **kwargs):
+        is_write = self.post_scheduler is not None and str(kwargs.get("url", "")).endswith(WRITE_ENDPOINTS)
+        try:
+            response = super()._invoke(invoke_type, **kwargs)
+        except AtProtocolError as e:
+            if is_write:
+                self.post_scheduler.observe_error(e)
+            raise
+        if is_write:
+            self.post_scheduler.observe(response.headers)
+        return response
 
 # BskyAccount handles authentication and posting to Bluesky
 class BskyAccount():
@@ -21,7 +33,9 @@ class BskyAccount():
         self.__chat_handler = None
         self.__post_handler = None
         self.config = config
-        self.client = Client()
+        self.post_scheduler = PostScheduler(config)
+        self.client = RateLimitedClient(base_url=self.config.get_xrpc_url())
+        self.client.post_scheduler = self.post_scheduler
         self.pds_url = self.config.get_pds_url()
         self.handle = self.config.handle
         self.password = self.config.password
@@ -49,6 +63,8 @@ class BskyAccount():
 
     def get_post_handler(self) -> BskyPostHandler:
         if not self.__post_handler:
+            # only runs that post need requests and the embed/facet code
+            from .bsky_post_handler import BskyPostHandler
             self.__post_handler = BskyPostHandler(self.config)
         return self.__post_handler
 
@@ -57,8 +73,13 @@ class BskyAccount():
             self.__chat_handler = BskyChatHandler(self.config)
         return self.__chat_handler
 
-    def post_article(self, article: BskyPost) -> None:
-        self.get_post_handler().create_post_new(article)
+    def post_article(self, article: BskyPost) -> bool:
+        with self.config.metrics.timer("post_seconds", mode="single"):
+            return self.get_post_handler().create_post_new(article)
+
+    def post_articles(self, articles: list[BskyPost]) -> bool:
+        with self.config.metrics.timer("post_seconds", mode="batch"):
+            return self.get_post_handler().create_posts_batch(articles)
 
     def get_did(self) -> str:
         if not self.__did:
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from dataclasses import dataclass, field
 from atproto import IdResolver, models
 from atproto.exceptions import AtProtocolError
 from src.commands import CommandHandler
@@ -6,6 +7,29 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from src.config import Config
 
+# keys in the database state table
+STATE_LOG_CURSOR = "chat_log_cursor"
+STATE_ADMIN_HANDLE = "chat_admin_handle"
+STATE_ADMIN_DID = "chat_admin_did"
+STATE_CONVO_ID = "chat_admin_convo_id"
+# getLog pages to read in one pass before leaving the rest for the next one
+MAX_LOG_PAGES = 20
+# chat.bsky.convo.sendMessageBatch takes at most this many messages
+MAX_MESSAGES_PER_BATCH = 100
+
+
+# The reactions, deletions and replies a pass over the admin chat wants to make. They are collected while the commands
+# run and sent together at the end, replies as a single sendMessageBatch call.
+@dataclass
+class ChatActions:
+    reactions: list[tuple[str, str]] = field(default_factory=list)
+    deletions: list[str] = field(default_factory=list)
+    replies: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.reactions or self.deletions or self.replies)
+
+
 class BskyChatHandler:
     def __init__(self, config: Config):
         self.config = config
@@ -17,14 +41,42 @@ class BskyChatHandler:
         self.dm_client = self.client.with_bsky_chat_proxy()
         self.dm = self.dm_client.chat.bsky.convo
 
-    def check_for_commands(self):
+    def check_for_commands(self) -> bool:
+        """Process new admin messages. Returns True if there were any."""
         self.config.logger.debug("Checking chat messages for admin commands:")
-        convo = self.__get_admin_convo()
-        messages = self.__get_admin_messages(convo)
-        if self.__parse_messages(messages, convo.id):
+        db = self.config.db
+        admin_handle = self.config.get_admin_handle()
+        cursor = db.get_state(STATE_LOG_CURSOR)
+        convo_id = db.get_state(STATE_CONVO_ID)
+        self.admin_did = self.admin_did or db.get_state(STATE_ADMIN_DID)
+        handled_ids = set()
+        actions = ChatActions()
+
+        # commands in this pass that edit the same config file only rewrite it once
+        with self.config.batched_writes():
+            if (cursor is None or convo_id is None or not self.admin_did
+                    or db.get_state(STATE_ADMIN_HANDLE) != admin_handle):
+                # first run or a new admin: go through the whole chat once, then follow its log from there
+                self.admin_did = None
+                convo = self.__get_admin_convo()
+                convo_id, cursor = convo.id, convo.rev
+                messages = self.__get_admin_messages(convo).messages
+                self.__parse_messages(messages, actions)
+                handled_ids = {message.id for message in messages}
+
+            messages, new_cursor = self.__get_new_admin_messages(convo_id, cursor)
+            self.__parse_messages([message for message in messages if message.id not in handled_ids], actions)
+
+        # remember where we got to before replying, so a failed reply never runs a command twice
+        db.set_states({STATE_LOG_CURSOR: new_cursor, STATE_CONVO_ID: convo_id,
+                       STATE_ADMIN_HANDLE: admin_handle, STATE_ADMIN_DID: self.admin_did})
+        self.__apply_actions(actions, convo_id)
+        if actions:
             self.config.logger.info(" Processed admin chat messages")
         else:
-            self.config.logger.info("   No admin chat messages to process")    
+            # debug only, the daemon checks every few seconds
+            self.config.logger.debug("   No admin chat messages to process")
+        return bool(actions)
 
     def __get_admin_did(self) -> str:
         admin_handle = self.config.get_admin_handle()
@@ -45,7 +97,7 @@ class BskyChatHandler:
             admin_did = self.__get_admin_did()
             params = models.ChatBskyConvoGetConvoForMembers.Params(members=[admin_did])
             convo = self.dm.get_convo_for_members(params=params).convo
-            self.config.logger.debug(f"  Found chat with admin {self.config.get_admin_handle().split(".")[0]}")
+            self.config.logger.debug(f"  Found chat with admin {self.config.get_admin_handle().split('.')[0]}")
             return convo
         except AtProtocolError as e:
             self.config.logger.error(f"Error fetching conversations: {e}")
@@ -60,58 +112,72 @@ class BskyChatHandler:
             self.config.logger.error(f"Error fetching messages: {e}")
             raise
 
-    def __parse_messages(self, messages: models.ChatBskyConvoGetMessages.Response, convo_id: str) -> bool:
-        did_something = False
-        for message in messages.messages:
+    def __get_new_admin_messages(self, convo_id: str, cursor: str) -> tuple[list[models.ChatBskyConvoDefs.MessageView], str]:
+        """Read the chat log since cursor. Returns the new messages in the admin chat and the cursor to continue from."""
+        messages = []
+        try:
+            for _ in range(MAX_LOG_PAGES):
+                response = self.dm.get_log(models.ChatBskyConvoGetLog.Params(cursor=cursor))
+                for log in response.logs:
+                    if (isinstance(log, models.ChatBskyConvoDefs.LogCreateMessage) and log.convo_id == convo_id
+                            and isinstance(log.message, models.ChatBskyConvoDefs.MessageView)):
+                        messages.append(log.message)
+                if not response.logs or not response.cursor or response.cursor == cursor:
+                    cursor = response.cursor or cursor
+                    break
+                cursor = response.cursor
+        except AtProtocolError as e:
+            self.config.logger.error(f"Error fetching chat log: {e}")
+            raise
+        self.config.logger.debug(f"  Retrieved {len(messages)} new messages in the chat")
+        return messages, cursor
+
+    def __parse_messages(self, messages: list, actions: ChatActions) -> None:
+        own_did = self.config.get_bsky_account().get_did()
+        for message in messages:
             if isinstance(message, models.ChatBskyConvoDefs.MessageView):
-                if (message.reactions and message.sender.did == self.admin_did) or message.sender.did == self.config.get_bsky_account().get_did():
-                    self.dm.delete_message_for_self(models.ChatBskyConvoDeleteMessageForSelf.Data(convo_id=convo_id, message_id=message.id))
-                    did_something = True
+                if (message.reactions and message.sender.did == self.admin_did) or message.sender.did == own_did:
+                    actions.deletions.append(message.id)
                 if not message.reactions and message.sender.did == self.admin_did:
                     text = message.text
                     if (response := self.command_handler.parse_commands(text)):
-                        # A command was found and we got a response
-                        if response:
-                            # react with a thumbs-up to show the command was successful
-                            try:
-                                self.dm.add_reaction(models.ChatBskyConvoAddReaction.Data(convo_id=convo_id, message_id=message.id, value="👍"))
-                                self.dm.delete_message_for_self(models.ChatBskyConvoDeleteMessageForSelf.Data(convo_id=convo_id, message_id=message.id))
-                                did_something = True
-                            except AtProtocolError as e:
-                                self.config.logger.warning(f"Error marking completed command: {e}")
-                        
-                        if response.response and len(response.response) > 0 and len(response.response) < 999:
-                            try:
-                                self.dm.send_message(models.ChatBskyConvoSendMessage.Data(
-                                    convo_id=convo_id, 
-                                    message=models.ChatBskyConvoDefs.MessageInput(text=response.response)))
-                                did_something = True
-                            except AtProtocolError as e:
-                                self.config.logger.error(f"Error replying to convo: {e}")
+                        # A command was found, react with a thumbs-up to show the command was successful
+                        actions.reactions.append((message.id, "👍"))
+                        actions.deletions.append(message.id)
+                        if response.response and len(response.response) < 999:
+                            actions.replies.append(response.response)
                         # can only post 1000 grapheme messages, so this splits it if its longer:
-                        elif response.response and len(response.response) > 999:
+                        elif response.response:
                             try:
-                                message_texts = split_pipe_string(response.response)
-                                msg_datas = []
-                                for msg_txt in message_texts:
-                                    message_data = models.ChatBskyConvoSendMessageBatch.BatchItem(
-                                        convo_id=convo_id,
-                                        message=models.ChatBskyConvoDefs.MessageInput(text=msg_txt)
-                                    )
-                                    msg_datas.append(message_data)
-                                self.dm.send_message_batch(models.ChatBskyConvoSendMessageBatch.Data(items=msg_datas))
-                                did_something = True
-                            except AtProtocolError as e:
+                                actions.replies.extend(split_pipe_string(response.response))
+                            except ValueError as e:
                                 self.config.logger.error(f"Error replying to convo: {e}")
                     else:
                         # No command found, react with a question mark to indicate unrecognized command
-                        try:                            
-                            self.dm.add_reaction(models.ChatBskyConvoAddReaction.Data(convo_id=convo_id, message_id=message.id, value="❓"))
-                            self.dm.delete_message_for_self(models.ChatBskyConvoDeleteMessageForSelf.Data(convo_id=convo_id, message_id=message.id))
-                            did_something = True
-                        except AtProtocolError as e:
-                            self.config.logger.warning(f"Error marking unrecognized command: {e}")
-        return did_something
+                        actions.reactions.append((message.id, "❓"))
+                        actions.deletions.append(message.id)
+
+    def __apply_actions(self, actions: ChatActions, convo_id: str) -> None:
+        # the chat API has no batch call for reactions and deletions, so those still go one message at a time
+        for message_id, value in actions.reactions:
+            try:
+                self.dm.add_reaction(models.ChatBskyConvoAddReaction.Data(convo_id=convo_id, message_id=message_id, value=value))
+            except AtProtocolError as e:
+                self.config.logger.warning(f"Error marking command: {e}")
+        for message_id in dict.fromkeys(actions.deletions):
+            try:
+                self.dm.delete_message_for_self(models.ChatBskyConvoDeleteMessageForSelf.Data(convo_id=convo_id, message_id=message_id))
+            except AtProtocolError as e:
+                self.config.logger.warning(f"Error deleting processed message: {e}")
+        for i in range(0, len(actions.replies), MAX_MESSAGES_PER_BATCH):
+            items = [models.ChatBskyConvoSendMessageBatch.BatchItem(
+                        convo_id=convo_id,
+                        message=models.ChatBskyConvoDefs.MessageInput(text=text))
+                     for text in actions.replies[i:i + MAX_MESSAGES_PER_BATCH]]
+            try:
+                self.dm.send_message_batch(models.ChatBskyConvoSendMessageBatch.Data(items=items))
+            except AtProtocolError as e:
+                self.config.logger.error(f"Error replying to convo: {e}")
 
 def split_pipe_string(s: str, max_len: int = 999) -> list[str]:
     parts = s.split('|')
@@ -1,27 +1,62 @@
 # Definition of BskyPost class - represents an article to be posted
 from __future__ import annotations
-import html
-import re
 import time
+import src.richtext as richtext
+import src.timestamps as timestamps
 import src.tags as tags
-from src.aisummary import Summarizer
 from typing import Any, Dict, TYPE_CHECKING
 if TYPE_CHECKING:
     from src.config import Config
+    from src.data import OutboxEntry
 
 
 class BskyPost:
-    def __init__(self, source_name: str, headline: str, description: str, link: str, img_url: str, tag: str, created_at: str, config: Config):
+    def __init__(self, source_name: str, headline: str, description: str, link: str, img_url: str, tag: str, created_at: str, config: Config,
+                 published_epoch: int | None = None):
         self.source_name = source_name
         self.headline = headline
         self.description = description
         self.link = link
         self.img_url = img_url
         self.tag = tag
+        # created_at is for display; published_epoch is the publication time in unix seconds, or None if undated
         self.created_at = created_at
+        self.published_epoch = published_epoch
         self.post_text = None
+        self.prepared = False
+        self.outbox_id: int | None = None
+        self.ai_score: float | None = None
         self.config = config
 
+    # the fields needed to rebuild this article from the outbox
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "source_name": self.source_name,
+            "headline": self.headline,
+            "description": self.description,
+            "link": self.link,
+            "img_url": self.img_url,
+            "tag": self.tag,
+            "created_at": self.created_at,
+            "published_epoch": self.published_epoch,
+            "ai_score": self.ai_score,
+        }
+
+    @classmethod
+    def from_outbox(cls, entry: OutboxEntry, config: Config) -> BskyPost:
+        article = dict(entry.article)
+        ai_score = article.pop("ai_score", None)
+        if "published_epoch" not in article:
+            # queued before the publication time was stored
+            article["published_epoch"] = timestamps.parse_timestamp(article.get("created_at", ""))
+        post = cls(config=config, **article)
+        post.ai_score = ai_score
+        post.outbox_id = entry.id
+        if entry.post_text:
+            post.post_text = entry.post_text
+            post.prepared = True
+        return post
+
     # gets the text of the post as it will be seen on Bluesky, including tags
     def get_post_text(self) -> str: 
         if not self.post_text:
@@ -35,47 +70,32 @@ class BskyPost:
         return self.post_text
 
     def add_tags_to_post(self) -> tuple[str, str]:
-        post_text, tag_str = tags.add_tags_to_post(self, self.config.get_tags())
+        post_text, tag_str = tags.add_tags_to_post(self, self.config.get_tag_matchers())
         return post_text, tag_str
 
 
-    def post_to_bluesky(self) -> None: 
-        self.config.logger.debug(f"  Posting article: {self.headline}")
-        start_time = time.time()
+    # generates the final post text (summary or cleaned description, trimmed to fit the tags)
+    def prepare_post(self) -> None:
+        if self.prepared:
+            return
         self.post_text = self.get_post_text().rstrip()
         self.config.logger.debug(f"  Generated post text: {self.post_text}")
         self.post_text, tag_str = self.add_tags_to_post()
         self.config.logger.debug(f"  Keyword matched tags: {tag_str}")
-        self.config.get_bsky_account().post_article(self)
+        self.prepared = True
+
+    def post_to_bluesky(self) -> bool: 
+        self.config.logger.debug(f"  Posting article: {self.headline}")
+        start_time = time.time()
+        self.prepare_post()
+        if not self.config.get_bsky_account().post_article(self):
+            return False
         end_time = time.time()
         self.config.logger.info(f"   Finished posting to Bluesky ({end_time - start_time:.2f} seconds)")
+        return True
 
     def format_post_text(self) -> str:
-        text = f"{self.headline}\n\n{self.description}"
-
-        # convert HTML entities
-        text = html.unescape(text)
-
-        # handle <a href="...">text</a> => "text (url)"
-        def _replace_a(m):
-            href = m.group(1)
-            inner = re.sub(r'<[^>]+>', '', m.group(2) or '')
-            return f"{inner} ({href})"
-        text = re.sub(r'(?i)<\s*a\b[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</\s*a\s*>', _replace_a, text)
-
-        # replace block-level tags with newlines
-        text = re.sub(r'(?i)<\s*(br|p|div|li|tr|h[1-6])\b[^>]*>', '\n', text)
-        text = re.sub(r'(?i)</\s*(p|div|li|tr|h[1-6])\s*>', '', text)
-
-        # remove any other tags
-        text = re.sub(r'<[^>]+>', '', text)
-
-        # normalize whitespace and newlines
-        text = text.replace('\r', '')
-        text = re.sub(r'\n{3,}', '\n', text)
-        text = re.sub(r'[ \t]+', ' ', text).strip()
-
-        return text
+        return richtext.html_to_text(f"{self.headline}\n\n{self.description}")
     
     def get_post_args(self) -> dict[str, str]:
         return {
@@ -87,7 +107,7 @@ class BskyPost:
         }
     
     def get_ai_summary(self) -> str:
-        if not self.config.get_summarizer().is_enabled():
+        if not self.config.get_summarizer().is_enabled() or self.config.past_deadline("summaries"):
             return ""
         
         self.config.logger.info(f"   Generating AI summary for: {self.headline}")
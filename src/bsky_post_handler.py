@@ -8,77 +8,46 @@ import requests
 from atproto.exceptions import AtProtocolError
 from atproto_client import models
 from typing import TYPE_CHECKING
+import src.richtext as richtext
 from src.bsky_post import BskyPost
+from src.metrics import SIZE_BUCKETS
 if TYPE_CHECKING:
     from src.config import Config
 
+POST_COLLECTION = "app.bsky.feed.post"
+_OG_IMAGE_RE = re.compile(r'<meta property="og:image" content="([^"]+)"')
+
 class BskyPostHandler:
     def __init__(self, config: Config):
         self.config = config
         self.client = config.get_bsky_account().client
         self.logger = config.logger
 
-    def parse_hashtags_new(self, post_text: str) -> list[models.AppBskyRichtextFacet.Main]:
-        facets =[]
-        hashtag_regex = rb"[$|\W](#([a-zA-Z0-9_]{1,30}))"
-        text_bytes = post_text.encode("UTF-8")
-        
-        for m in re.finditer(hashtag_regex, text_bytes):
-            start = m.start(1)
-            end = m.end(1)
-            tag = m.group(1).decode("UTF-8")
-            self.logger.debug(f"found hashtag: {tag} at bytes {start} to {end}")
-            facets.append(models.AppBskyRichtextFacet.Main(
-                features=[models.AppBskyRichtextFacet.Tag(tag = tag)],
-                index = models.AppBskyRichtextFacet.ByteSlice(byte_start=start, byte_end=end)
-            ))
-        return facets
-
-    def parse_mentions_new(self, post_text: str) -> list[models.AppBskyRichtextFacet.Main]:
-        facets = []
-        mention_regex = rb"[$|\W](@([a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)"
-        text_bytes = post_text.encode("UTF-8")
-        
-        for m in re.finditer(mention_regex, text_bytes):
-            start = m.start(1)
-            end = m.end(1)
-            handle = m.group(1)[1:].decode("UTF-8")
-            did = self.client.resolve_handle(handle).did
-            facets.append(models.AppBskyRichtextFacet.Main(
-                features=[models.AppBskyRichtextFacet.Mention(did=did)],
-                index = models.AppBskyRichtextFacet.ByteSlice(byte_start=start, byte_end=end)
-            ))
-        return facets
-
-    def parse_urls_new(self, post_text: str) -> list[models.AppBskyRichtextFacet.Main]:
+    def parse_facets_new(self, post_text: str) -> list[models.AppBskyRichtextFacet.Main]:
         facets = []
-        url_regex = rb"[$|\W](https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*[-a-zA-Z0-9@%_\+~#//=])?)"
-        text_bytes = post_text.encode("UTF-8")
-        
-        for m in re.finditer(url_regex, text_bytes):
-            start = m.start(1)
-            end = m.end(1)
-            url = m.group(1).decode("UTF-8")
+        for match in richtext.find_facets(post_text):
+            if match.kind == richtext.FACET_LINK:
+                feature = models.AppBskyRichtextFacet.Link(uri = match.value)
+            elif match.kind == richtext.FACET_MENTION:
+                feature = models.AppBskyRichtextFacet.Mention(did = self.client.resolve_handle(match.value).did)
+            else:
+                self.logger.debug(f"found hashtag: {match.value} at bytes {match.byte_start} to {match.byte_end}")
+                feature = models.AppBskyRichtextFacet.Tag(tag = match.value)
             facets.append(models.AppBskyRichtextFacet.Main(
-                features=[models.AppBskyRichtextFacet.Link(uri = url)],
-                index = models.AppBskyRichtextFacet.ByteSlice(byte_start = start, byte_end = end)
+                features=[feature],
+                index = models.AppBskyRichtextFacet.ByteSlice(byte_start = match.byte_start, byte_end = match.byte_end)
             ))
-
-        return facets
-
-    def parse_facets_new(self, post_text: str) -> list[models.AppBskyRichtextFacet.Main]:
-        facets = self.parse_urls_new(post_text)
-        facets.extend(self.parse_mentions_new(post_text))
-        facets.extend(self.parse_hashtags_new(post_text))
         return facets
 
     def get_embed_card(self, bsky_post: BskyPost) -> models.AppBskyEmbedExternal.Main:
         card = models.AppBskyEmbedExternal.External(
             uri=bsky_post.link,
-            title=re.sub(r'<[^>]+>', '', bsky_post.headline),
-            description=re.sub(r'<[^>]+>', '', bsky_post.description),
+            title=richtext.strip_tags(bsky_post.headline),
+            description=richtext.strip_tags(bsky_post.description),
         )
         img_url = bsky_post.img_url
+        if self.config.past_deadline("thumbnails"):
+            return models.AppBskyEmbedExternal.Main(external = card)
 
         if img_url and len(img_url) > 0:
             try:
@@ -86,7 +55,7 @@ class BskyPostHandler:
                 resp = requests.get(img_url)
                 resp.raise_for_status()
                 self.config.get_bsky_account().login()
-                card.thumb = self.client.upload_blob(resp.content).blob
+                card.thumb = self.upload_thumb(resp.content)
             except Exception as e:
                 self.logger.warning(f"Could not fetch image for embed card: {bsky_post.img_url},{e}")
                 card.thumb = None
@@ -99,7 +68,7 @@ class BskyPostHandler:
                     resp = requests.get(img_url)
                     resp.raise_for_status()
                     self.config.get_bsky_account().login()
-                    card.thumb = self.client.upload_blob(resp.content).blob
+                    card.thumb = self.upload_thumb(resp.content)
                 except Exception as e:
                     if isinstance(e, requests.HTTPError):
                         try: #try with flaresolverr proxy if we got an HTTP error, in case it's a bot protection issue
@@ -113,7 +82,7 @@ class BskyPostHandler:
                                 img_data = resp.json().get("solution", {}).get("response", "")
                                 if img_data:
                                     self.config.get_bsky_account().login()
-                                    card.thumb = self.client.upload_blob(img_data.encode()).blob
+                                    card.thumb = self.upload_thumb(img_data.encode())
                                     return models.AppBskyEmbedExternal.Main(external = card)
                                 else:
                                     self.logger.warning(f"FlareSolverr proxy did not return image data for {img_url}")
@@ -134,19 +103,24 @@ class BskyPostHandler:
                     resp = requests.get(default_img_url)
                     resp.raise_for_status()
                     self.config.get_bsky_account().login()
-                    card.thumb = self.client.upload_blob(resp.content).blob
+                    card.thumb = self.upload_thumb(resp.content)
                 except Exception as e:
                     self.logger.warning(f"Could not fetch default image for embed card: {bsky_post.source_name},{e}")
                     card.thumb = None
 
         return models.AppBskyEmbedExternal.Main(external = card)
 
+    def upload_thumb(self, data: bytes) -> models.BlobRef:
+        with self.config.metrics.timer("image_upload_seconds"):
+            blob = self.client.upload_blob(data).blob
+        self.config.metrics.observe("image_upload_bytes", len(data), SIZE_BUCKETS)
+        return blob
+
     def get_img_url_from_open_graph(self, bsky_post: BskyPost) -> str:
         try:
             resp = requests.get(bsky_post.link, timeout=5)
             resp.raise_for_status()
-            og_image_regex = r'<meta property="og:image" content="([^"]+)"'
-            match = re.search(og_image_regex, resp.text)
+            match = _OG_IMAGE_RE.search(resp.text)
             if match:
                 img_url = match.group(1)
                 self.logger.debug(f"Found og:image for {bsky_post.link}: {img_url}")
@@ -158,6 +132,16 @@ class BskyPostHandler:
             self.logger.warning(f"Error fetching Open Graph data for {bsky_post.link}: {e}")
             return ""
     
+    def build_post_record(self, bsky_post: BskyPost) -> models.AppBskyFeedPost.Record:
+        text = bsky_post.get_post_text()
+        return models.AppBskyFeedPost.Record(
+            created_at = self.client.get_current_time_iso(),
+            text = text,
+            embed = self.get_embed_card(bsky_post),
+            facets = self.parse_facets_new(text),
+            langs = ["en"],
+        )
+
     def create_post_new(self, bsky_post: BskyPost) -> bool:
         text = bsky_post.get_post_text()
         profile_identity = self.config.get_bsky_account().handle
@@ -178,3 +162,18 @@ class BskyPostHandler:
                 self.logger.error(f"Error creating post: {e}")
                 return False
 
+    # builds every record locally and commits them together in one com.atproto.repo.applyWrites call
+    def create_posts_batch(self, bsky_posts: list[BskyPost]) -> bool:
+        writes = [models.ComAtprotoRepoApplyWrites.Create(collection = POST_COLLECTION, value = self.build_post_record(post))
+                  for post in bsky_posts]
+        try:
+            self.config.get_bsky_account().login()
+            response = self.client.com.atproto.repo.apply_writes(
+                models.ComAtprotoRepoApplyWrites.Data(repo = self.client.me.did, writes = writes))
+            if response is None:
+                self.logger.warning(f"Could not post batch of {len(writes)} articles (invalid response)")
+                return False
+            return True
+        except AtProtocolError as e:
+            self.logger.error(f"Error creating batch of {len(writes)} posts: {e}")
+            return False
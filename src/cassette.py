@@ -0,0 +1,286 @@
+from __future__ import annotations
+import base64
+import collections
+import email.message
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import urllib.response
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+from urllib.parse import urlsplit
+if TYPE_CHECKING:
+    import logging
+
+INTERACTIONS_FILE = "interactions.jsonl"
+DATABASE_FILE = "database.sqlite"
+# requests and httpx hand out decoded bodies, so these headers would no longer describe what is replayed
+DECODED_BODY_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class ReplayMiss(ConnectionError):
+    """A request the cassette has no (more) recorded responses for."""
+
+
+# Cassette records every outbound HTTP request of a run, whichever library makes it (urllib for RSS feeds, requests
+# for newspaper and images, httpx for atproto and google-genai), and plays the responses back in a later run, with
+# the recorded timings scaled by speed (0 for no waiting). A cassette is a directory holding interactions.jsonl and a
+# copy of the database as it was when recording started, which replays run against instead of the real one, so
+# every replay of a cassette sees the same inputs. Replays never touch the network: a request that was not recorded
+# fails like an unreachable server.
+# Recorded responses include the Bluesky session tokens: keep cassettes private.
+class Cassette:
+    def __init__(self, path: Path, mode: str, logger: logging.Logger, speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"unknown cassette mode {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.logger = logger
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.interactions: dict[tuple[str, str], collections.deque] = collections.defaultdict(collections.deque)
+        self.by_path: dict[tuple[str, str], collections.deque] = collections.defaultdict(collections.deque)
+        self.originals: list[tuple[Any, str, Any]] = []
+        self.replay_db_dir: str | None = None
+
+        if mode == "record":
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path / INTERACTIONS_FILE, "w", encoding="utf-8")
+        else:
+            with open(self.path / INTERACTIONS_FILE, encoding="utf-8") as f:
+                for line in f:
+                    interaction = json.loads(line)
+                    self.interactions[(interaction["method"], interaction["url"])].append(interaction)
+                    self.by_path[(interaction["method"], _without_query(interaction["url"]))].append(interaction)
+            self.logger.info(f" Replaying {sum(map(len, self.interactions.values()))} recorded requests from {self.path}"
+                             f" at {'no waiting' if speed == 0 else f'{speed}x the recorded timings'}")
+
+    # --- database ------------------------------------------------------------------------------------------------
+
+    def snapshot_database(self, db_path: Path) -> None:
+        """Keep a copy of the database as it is before the recorded run."""
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(self.path / DATABASE_FILE)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    def replay_database(self) -> Path:
+        """A scratch copy of the recorded database for this replay to change."""
+        self.replay_db_dir = tempfile.mkdtemp(prefix="cassette-")
+        path = Path(self.replay_db_dir) / DATABASE_FILE
+        shutil.copyfile(self.path / DATABASE_FILE, path)
+        return path
+
+    # --- patching -------------------------------------------------------------------------------------------------
+
+    def install(self) -> None:
+        """Route the HTTP libraries through the cassette until uninstall()."""
+        self.__patch(urllib.request.OpenerDirector, "open", self.__urllib_open)
+        try:
+            import requests
+            self.__patch(requests.Session, "send", self.__requests_send)
+        except ImportError:
+            pass
+        try:
+            import httpx
+            self.__patch(httpx.Client, "send", self.__httpx_send)
+        except ImportError:
+            pass
+
+    def uninstall(self) -> None:
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+        if self.mode == "record":
+            self.file.close()
+            self.logger.info(f" Recorded {self.recorded} requests to {self.path}")
+        else:
+            if self.replay_db_dir:
+                shutil.rmtree(self.replay_db_dir, ignore_errors=True)
+            self.logger.info(f" Replayed {self.replayed} requests, {self.misses} were not in the cassette")
+
+    def __patch(self, owner: Any, name: str, replacement: Any) -> None:
+        original = getattr(owner, name)
+        self.originals.append((owner, name, original))
+
+        def patched(instance, *args, **kwargs):
+            return replacement(original, instance, *args, **kwargs)
+        setattr(owner, name, patched)
+
+    # --- recording and lookup -------------------------------------------------------------------------------------
+
+    def __record(self, transport: str, method: str, url: str, elapsed: float, status: int | None = None,
+                 headers: dict[str, str] | None = None, body: bytes = b"", error: str | None = None) -> None:
+        if transport != "urllib":
+            headers = {key: value for key, value in (headers or {}).items() if key.lower() not in DECODED_BODY_HEADERS}
+        interaction = {
+            "transport": transport, "method": method, "url": url, "at": round(time.monotonic() - self.started_at, 4),
+            "elapsed": round(elapsed, 4), "status": status, "headers": headers or {},
+            "body": base64.b64encode(body).decode("ascii"), "error": error,
+        }
+        with self.lock:
+            self.file.write(json.dumps(interaction) + "\n")
+            self.file.flush()
+            self.recorded += 1
+
+    def __next(self, method: str, url: str) -> dict:
+        """The next recorded response for a request, by exact URL first and then by URL without the query string."""
+        with self.lock:
+            for queue, key in ((self.interactions, (method, url)), (self.by_path, (method, _without_query(url)))):
+                while queue[key]:
+                    interaction = queue[key].popleft()
+                    if not interaction.get("used"):
+                        interaction["used"] = True
+                        self.replayed += 1
+                        break
+                else:
+                    continue
+                break
+            else:
+                self.misses += 1
+                raise ReplayMiss(f"no recorded response for {method} {url}")
+        if self.speed > 0 and interaction["elapsed"] > 0:
+            time.sleep(interaction["elapsed"] * self.speed)
+        return interaction
+
+    def __replayed_body(self, interaction: dict) -> bytes:
+        body = base64.b64decode(interaction["body"])
+        if b"accessJwt" in body:
+            body = _refresh_session_tokens(body)
+        return body
+
+    # --- urllib (RSS feeds) ---------------------------------------------------------------------------------------
+
+    def __urllib_open(self, original, opener, fullurl, data=None, *args, **kwargs):
+        request = fullurl if isinstance(fullurl, urllib.request.Request) else urllib.request.Request(fullurl, data)
+        url = request.full_url
+        method = request.get_method()
+        if self.mode == "replay":
+            try:
+                interaction = self.__next(method, url)
+            except ReplayMiss as e:
+                raise urllib.error.URLError(str(e))
+            if interaction["error"]:
+                raise urllib.error.URLError(interaction["error"])
+            headers = email.message.Message()
+            for key, value in interaction["headers"].items():
+                headers[key] = value
+            body = io.BytesIO(self.__replayed_body(interaction))
+            if interaction["status"] >= 400:
+                raise urllib.error.HTTPError(url, interaction["status"], "replayed error", headers, body)
+            return urllib.response.addinfourl(body, headers, url, interaction["status"])
+
+        start = time.monotonic()
+        try:
+            response = original(opener, fullurl, data, *args, **kwargs)
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            self.__record("urllib", method, url, time.monotonic() - start, e.code, dict(e.headers.items()), body)
+            raise urllib.error.HTTPError(e.url, e.code, e.msg, e.headers, io.BytesIO(body))
+        except OSError as e:
+            self.__record("urllib", method, url, time.monotonic() - start, error=str(e))
+            raise
+        body = response.read()
+        headers = response.headers
+        status = response.status
+        final_url = response.geturl()
+        response.close()
+        self.__record("urllib", method, url, time.monotonic() - start, status, dict(headers.items()), body)
+        # the body has been read, so hand back a fresh copy of the response
+        return urllib.response.addinfourl(io.BytesIO(body), headers, final_url, status)
+
+    # --- requests (newspaper, embed card images) ------------------------------------------------------------------
+
+    def __requests_send(self, original, session, request, **kwargs):
+        import requests
+        if self.mode == "replay":
+            try:
+                interaction = self.__next(request.method, request.url)
+            except ReplayMiss as e:
+                raise requests.ConnectionError(str(e), request=request)
+            if interaction["error"]:
+                raise requests.ConnectionError(interaction["error"], request=request)
+            response = requests.Response()
+            response.status_code = interaction["status"]
+            response.headers = requests.structures.CaseInsensitiveDict(interaction["headers"])
+            response._content = self.__replayed_body(interaction)
+            response.url = request.url
+            response.request = request
+            response.reason = "replayed"
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            return response
+
+        start = time.monotonic()
+        try:
+            response = original(session, request, **kwargs)
+        except requests.RequestException as e:
+            self.__record("requests", request.method, request.url, time.monotonic() - start, error=str(e))
+            raise
+        self.__record("requests", request.method, request.url, time.monotonic() - start, response.status_code,
+                      dict(response.headers), response.content)
+        return response
+
+    # --- httpx (atproto, google-genai) ----------------------------------------------------------------------------
+
+    def __httpx_send(self, original, client, request, **kwargs):
+        import httpx
+        url = str(request.url)
+        if self.mode == "replay":
+            try:
+                interaction = self.__next(request.method, url)
+            except ReplayMiss as e:
+                raise httpx.ConnectError(str(e), request=request)
+            if interaction["error"]:
+                raise httpx.ConnectError(interaction["error"], request=request)
+            return httpx.Response(interaction["status"], headers=interaction["headers"],
+                                  content=self.__replayed_body(interaction), request=request)
+
+        start = time.monotonic()
+        try:
+            response = original(client, request, **kwargs)
+            response.read()
+        except httpx.HTTPError as e:
+            self.__record("httpx", request.method, url, time.monotonic() - start, error=str(e))
+            raise
+        self.__record("httpx", request.method, url, time.monotonic() - start, response.status_code,
+                      dict(response.headers), response.content)
+        return response
+
+
+def _without_query(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def _refresh_session_tokens(body: bytes) -> bytes:
+    """Push the expiry of replayed session tokens into the future, so the client doesn't try to refresh them."""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    for key in ("accessJwt", "refreshJwt"):
+        token = data.get(key) if isinstance(data, dict) else None
+        if not token or token.count(".") != 2:
+            continue
+        header, payload, signature = token.split(".")
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except ValueError:
+            continue
+        claims["exp"] = int(time.time()) + 86400
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+        data[key] = f"{header}.{payload}.{signature}"
+    return json.dumps(data).encode()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import time
+from src.data import SourceHealth
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.config import Config
+    from src.config_snapshot import SourceConfig
+
+
+# SourceCircuitBreaker keeps feeds and websites that keep failing from costing a full timeout on every run. A source
+# that fails threshold fetches in a row is skipped (its circuit is open) for the base backoff; once that has passed the
+# next run tries it once (half-open). Success closes the circuit, another failure opens it again for twice as long,
+# up to the maximum backoff. One instance covers one fetch run; the state lives in the source_health table.
+class SourceCircuitBreaker:
+    def __init__(self, config: Config):
+        self.config = config
+        self.threshold = config.get_source_failure_threshold()
+        self.backoff = config.get_source_backoff_seconds()
+        self.health = config.db.get_source_health()
+        self.failing: list[SourceHealth] = []
+        self.recovered: list[str] = []
+        self.skipped: list[tuple[SourceConfig, SourceHealth]] = []
+        self.probed: list[str] = []
+        self.failed: list[str] = []
+        self.tried = 0
+
+    def allow(self, source: SourceConfig, now: float | None = None) -> bool:
+        """Whether to fetch a source this run, noting the ones skipped for the summary."""
+        health = self.health.get(source.url)
+        if self.threshold and health and health.open_until:
+            now = time.time() if now is None else now
+            if now < health.open_until:
+                self.skipped.append((source, health))
+                return False
+            self.probed.append(source.name)
+        self.tried += 1
+        return True
+
+    def record_success(self, source: SourceConfig) -> None:
+        if self.health.pop(source.url, None):
+            self.recovered.append(source.url)
+            self.config.logger.info(f" {source.name} is working again.")
+
+    def record_failure(self, source: SourceConfig, error: str, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        previous = self.health.get(source.url)
+        failures = (previous.consecutive_failures if previous else 0) + 1
+        open_until = None
+        if self.threshold and failures >= self.threshold:
+            wait = min(self.backoff["base"] * 2 ** (failures - self.threshold), self.backoff["max"])
+            open_until = now + wait
+            self.config.logger.warning(f" {source.name} failed {failures} times in a row, skipping it for "
+                                       f"{wait / 60:.0f} minutes: {error}")
+        health = SourceHealth(source.url, failures, error[:500], now, open_until)
+        self.health[source.url] = health
+        self.failing.append(health)
+        self.failed.append(source.name)
+
+    def save(self) -> None:
+        if self.failing or self.recovered:
+            self.config.db.save_source_health(self.failing, self.recovered)
+            self.failing, self.recovered = [], []
+
+    def summary(self) -> str:
+        line = f" Sources: {self.tried - len(self.failed)} ok, {len(self.failed)} failed"
+        if self.failed:
+            line += f" ({', '.join(self.failed)})"
+        if self.probed:
+            line += f", {len(self.probed)} retried after backing off ({', '.join(self.probed)})"
+        if self.skipped:
+            skipped = ", ".join(f"{source.name} until {time.strftime('%H:%M', time.localtime(health.open_until))}"
+                                for source, health in self.skipped)
+            line += f", {len(self.skipped)} skipped while failing ({skipped})"
+        return line + "."
@@ -1,16 +1,39 @@
+from __future__ import annotations
 import datetime
 import os
 import sys
+import tempfile
+import threading
 
-from src.aisummary import Summarizer
 from src.data import DatabaseManager
-from src.bsky_account import BskyAccount
-from typing import Dict, Any
-from src.newsfilter import NewsFilter
-from src.keywordfilter import KeywordFilter
-from src.aifilter import AIFilter
+from src.metrics import Metrics
+from src.configcache import ConfigCache, Stamp, YAML_LOADER, stamp_bytes, stamp_file
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, TYPE_CHECKING
+from src.keywords import KeywordMatcher
+from src.config_snapshot import (KeywordSets, Settings, SourceConfig, Sources, TagSets, build_keyword_sets,
+                                 build_settings, build_sources, build_tag_sets)
 import yaml
 import logging
+# The Bluesky client, Gemini and the filters pull in heavy libraries (atproto, google-genai), so they are imported
+# when first used rather than at startup
+if TYPE_CHECKING:
+    from src.aisummary import Summarizer
+    from src.bsky_account import BskyAccount
+    from src.newsfilter import NewsFilter
+    from src.cassette import Cassette
+    from src.profiling import StageProfiler
+    from src.runbudget import RunBudget
+
+# libyaml's dumper is much faster when PyYAML was built with it
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+# the config files that are reloaded when they change on disk, by key
+CONFIG_FILES = {
+    "main": "config/config.yml",
+    "feeds": "config/feeds.yml",
+    "filter": "config/filter.yml",
+    "tags": "config/tags.yml",
+}
 
 # Config handles reading and providing access to configuration settings from config.yml
 class Config:
@@ -20,8 +43,28 @@ class Config:
         self.logger = self.__create_logger()
         self.__bsky_account = None
         self.db = DatabaseManager()
+        self.metrics = Metrics()
+        # set by --profile / --profile-memory
+        self.profiler: StageProfiler | None = None
+        # set by --record / --replay
+        self.cassette: Cassette | None = None
+        # set for single runs when run_budget_seconds is
+        self.budget: RunBudget | None = None
         self._news_filter = None
         self.summarizer = None
+        # set when a long-running process has been asked to stop; work in progress finishes, nothing new starts
+        self.shutdown = threading.Event()
+        # called between pipeline stages, e.g. so the daemon can pick up admin commands in the middle of a long run
+        self.stage_hooks: list[Callable[[], object]] = []
+
+    def past_deadline(self, stage: str) -> bool:
+        """Whether this run is out of time for the optional work of a stage (never without a run budget)."""
+        return self.budget is not None and self.budget.past(stage)
+
+    def between_stages(self) -> None:
+        """Give long-running work a chance to run between two steps of a fetch or posting run."""
+        for hook in self.stage_hooks:
+            hook()
 
     @property
     def news_filter(self) -> NewsFilter:
@@ -32,6 +75,7 @@ class Config:
 
     def get_summarizer(self) -> Summarizer:
         if self.summarizer is None:
+            from src.aisummary import Summarizer
             self.summarizer = Summarizer(self)
         return self.summarizer
     
@@ -40,31 +84,118 @@ class Config:
         filter_type = self.__main_config.get("filter_type", "keyword").lower()
         
         if filter_type == "ai":
+            from src.aifilter import AIFilter
             self.logger.info("Using AI-based news filter")
             return AIFilter(self)
         else:
+            from src.keywordfilter import KeywordFilter
             self.logger.info("Using keyword-based news filter")
             return KeywordFilter(self)
     
     def get_ai_filter_quality_threshold(self) -> float:
         """Get the quality threshold for AI filter (0.0-1.0)."""
-        threshold = self.__main_config.get("ai_filter_quality_threshold", 0.6)
-        try:
-            value = float(threshold)
-            return max(0.0, min(1.0, value))  # Clamp to 0-1
-        except (ValueError, TypeError):
-            return 0.6
+        return self.get_settings().ai_filter_quality_threshold
     
     def load_configs(self) -> None:
-        self.__main_config = self.read_config("config/config.yml")
-        self.__feed_config = self.read_config("config/feeds.yml")
-        self.__filter_config: dict[str, list[str]] = self.read_config("config/filter.yml")
-        self.__tags_config = self.read_config("config/tags.yml")
+        self.__configs: Dict[str, Dict[str, Any]] = {}
+        self.__file_stamps: Dict[str, Stamp | None] = {}
+        # parsed YAML from earlier runs, so unchanged files aren't parsed again
+        self.__config_cache = ConfigCache()
+        # structures built from a config file (compiled matchers, source lists), dropped when that file changes
+        self.__derived: Dict[str, Dict[str, Any]] = {}
+        # config files changed inside batched_writes(), by path
+        self.__pending_writes: Dict[str, Dict[str, Any]] | None = None
+        # config files that went missing after they were read, warned about once
+        self.__missing_files: set[str] = set()
+        for key, path in CONFIG_FILES.items():
+            self.__configs[key], self.__file_stamps[key] = self.__read_config_with_stamp(path)
+        self.__config_cache.save()
         try:
             self.__session = self.read_config("config/session.yml")
         except FileNotFoundError:
             self.__session = {}
 
+    @property
+    def __main_config(self) -> Dict[str, Any]:
+        return self.__configs["main"]
+
+    @property
+    def __feed_config(self) -> Dict[str, Any]:
+        return self.__configs["feeds"]
+
+    @property
+    def __filter_config(self) -> Dict[str, list[str]]:
+        return self.__configs["filter"]
+
+    @property
+    def __tags_config(self) -> Dict[str, list[str]]:
+        return self.__configs["tags"]
+
+    def reload_if_changed(self) -> list[str]:
+        """Reload the config files that changed on disk since they were read. Returns the keys of reloaded files."""
+        reloaded = []
+        for key, path in CONFIG_FILES.items():
+            old_stamp = self.__file_stamps.get(key)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None and old_stamp is None:
+                continue
+            if stat is None:
+                self.__keep_missing(key, path)
+                continue
+            # unchanged mtime and size: nothing is read, let alone parsed
+            if stat is not None and old_stamp is not None and old_stamp[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            try:
+                data, stamp = self.__read_config_with_stamp(path)
+            except yaml.YAMLError as e:
+                self.logger.error(f"Not reloading {path}, it could not be parsed: {e}")
+                self.__file_stamps[key] = stamp_file(path)
+                continue
+            if stamp is None:
+                # removed between the stat and the read
+                self.__keep_missing(key, path)
+                continue
+            self.__missing_files.discard(key)
+            self.__file_stamps[key] = stamp
+            # touched but the contents are the same
+            if stamp is not None and old_stamp is not None and stamp[2] == old_stamp[2]:
+                continue
+            self.__configs[key] = data
+            self.__invalidate(key)
+            reloaded.append(key)
+            self.logger.info(f" Reloaded {path}")
+        self.__config_cache.save()
+        return reloaded
+
+    def __keep_missing(self, key: str, path: str) -> None:
+        # editors that save by deleting and renaming leave the file missing for a moment; dropping its settings (the
+        # login, or every filter word) until it's back would be far worse than keeping the ones read last
+        if key not in self.__missing_files:
+            self.__missing_files.add(key)
+            self.logger.warning(f" {path} is missing, keeping its last settings until it is back.")
+
+    def __invalidate(self, key: str) -> None:
+        self.__derived.pop(key, None)
+        if key == "main":
+            # the filter type and Gemini settings live in config.yml
+            self._news_filter = None
+            self.summarizer = None
+
+    def __derive(self, key: str, name: str, build: Callable[[], Any]) -> Any:
+        cache = self.__derived.setdefault(key, {})
+        if name not in cache:
+            cache[name] = build()
+        return cache[name]
+
+    def __read_config_with_stamp(self, path: str) -> tuple[Dict[str, Any], Stamp | None]:
+        data, stamp = self.__config_cache.load(path)
+        if not isinstance(data, dict):
+            return {}, stamp
+        return data, stamp
+
     def get_handle_password(self) -> tuple[str, str]:
         return self.__main_config['bsky_handle'], self.__main_config['bsky_password']
 
@@ -75,6 +206,7 @@ class Config:
         
         self.handle = self.__main_config['bsky_handle']
         self.password = self.__main_config['bsky_password']
+        from src.bsky_account import BskyAccount
         return BskyAccount(self)
 
     def get_admin_handle(self) -> str:
@@ -91,7 +223,7 @@ class Config:
     def read_config(self, path: str) -> Dict[str, Any]:
         try:
             with open(path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f) or {}
+                data = yaml.load(f, Loader=YAML_LOADER) or {}
         except FileNotFoundError:
             return {}
         
@@ -99,35 +231,22 @@ class Config:
             return {}
         return data
 
+    # Returns the validated feeds.yml sources, built once per load
+    def get_sources(self) -> Sources:
+        return self.__derive("feeds", "sources", lambda: build_sources(self.__feed_config))
+
     # Returns the RSS feeds from config
-    def get_rss_feeds(self) -> Dict[str, Any]:
-        feeds = self.__feed_config.get("rss_feeds", {}) or {}
-        if not isinstance(feeds, dict):
-            raise ValueError("rss_feeds in config must be a mapping")
-        return feeds
+    def get_rss_feeds(self) -> tuple[SourceConfig, ...]:
+        return self.get_sources().rss
     
     # Returns the HTML sources from config
-    def get_html_sources(self) -> Dict[str, Any]:
-        sources = self.__feed_config.get("html_sources", {}) or {}
-        if not isinstance(sources, dict):
-            raise ValueError("html_sources in config must be a mapping")
-        return sources
+    def get_html_sources(self) -> tuple[SourceConfig, ...]:
+        return self.get_sources().html
     
     # Returns the default image URL for a given feed source name
     def get_default_image_for_source(self, source_name: str) -> str:
-        # Check RSS feeds
-        rss_feeds = self.get_rss_feeds()
-        for feed_key, feed_data in rss_feeds.items():
-            if feed_data.get('name') == source_name:
-                return feed_data.get('defaultimage', '')
-        
-        # Check HTML sources
-        html_sources = self.get_html_sources()
-        for source_key, source_data in html_sources.items():
-            if source_data.get('name') == source_name:
-                return source_data.get('defaultimage', '')
-        
-        return ''
+        source = self.get_sources().by_name.get(source_name)
+        return source.default_image if source else ''
     
     def get_super_bad_words(self) -> list[str]:
         super_bad_words = self.__filter_config.get("super_bad_words", []) or []
@@ -149,66 +268,215 @@ class Config:
             raise ValueError("good_words in config must be a list")
         return good_words
     
+    # Returns compiled matchers for the filter.yml word lists, built once per load
+    def get_keyword_sets(self) -> KeywordSets:
+        return self.__derive("filter", "keyword_sets", lambda: build_keyword_sets(
+            self.get_super_bad_words(), self.get_bad_words(), self.get_good_words()))
+
+    # Returns a compiled matcher for one of the filter.yml word lists (super_bad_words, bad_words or good_words)
+    def get_keyword_matcher(self, list_name: str) -> KeywordMatcher:
+        return getattr(self.get_keyword_sets(), list_name)
+
+    # Returns compiled matchers and keyword strings for tags.yml, built once per load
+    def get_tag_sets(self) -> TagSets:
+        return self.__derive("tags", "tag_sets", lambda: build_tag_sets(self.__tags_config))
+
+    # Returns a compiled keyword matcher for each tag in tags.yml
+    def get_tag_matchers(self) -> Dict[str, KeywordMatcher]:
+        return self.get_tag_sets().matchers
+
+    # Returns the validated config.yml settings, built once per load
+    def get_settings(self) -> Settings:
+        return self.__derive("main", "settings", lambda: build_settings(self.__main_config))
+
     # Returns the log level from config
     def get_log_level(self) -> str:
-        log_level = self.__main_config.get("log_level", "INFO")
-        if not isinstance(log_level, str):
-            raise ValueError("log_level in config must be a string")
-        return log_level
+        return self.get_settings().log_level
     
     def get_max_articles_per_feed(self) -> int:
-        max_articles = self.__main_config.get("max_articles_per_feed", 10)
-        if not isinstance(max_articles, int):
-            raise ValueError("max_articles in config must be an integer")
-        return max_articles
+        return self.get_settings().max_articles_per_feed
     
     def max_article_age_days(self) -> int:
-        max_age = self.__main_config.get("max_article_age_days", None)
-        if max_age is not None:
-            try:
-                return int(max_age)
-            except ValueError:
-                raise ValueError("max_article_age_days in config must be an integer")
-        return 10
+        return self.get_settings().max_article_age_days
     
     def get_tags(self) -> Dict[str, list[str]]:
         return self.__tags_config
     
     def get_tag_keywords(self, tag: str) -> str:
-        if not self.get_tags().get(tag):
-            return ""
-        kwds = self.get_tags()[tag]
-        if kwds:
-            kwd_string = "|".join(kwds)
-            return kwd_string
-        else:
-            return ""
+        return self.get_tag_sets().keyword_strings.get(tag, "")
 
     def get_gemini_api_key(self) -> str:
         return self.__main_config.get("gemini_api_key", "")
     
     def get_gemini_model(self) -> str:
         return self.__main_config.get("gemini_model", "")
+
+    # Options for google-genai's Client; gemini_base_url points it at another endpoint (e.g. a local stand-in)
+    def get_gemini_http_options(self) -> Dict[str, Any] | None:
+        base_url = self.__main_config.get("gemini_base_url", "")
+        return {"base_url": base_url} if base_url else None
     
     def get_ai_summary_prompt(self) -> str:
         return self.__main_config.get("ai_summary_prompt", "")
 
-    def get_delay_between_posts_seconds(self) -> int:
-        return self.__main_config.get("delay_between_posts_in_seconds", 3)
+    def get_delay_between_posts_seconds(self) -> float:
+        return self.get_settings().delay_between_posts
+
+    # Never post faster than this, however much rate limit headroom the PDS reports
+    def get_min_delay_between_posts_seconds(self) -> float:
+        return self.get_settings().min_delay_between_posts
+
+    # Rate limit points to leave unused so other writes (DM replies, manual posts) never hit a 429
+    def get_rate_limit_reserve_points(self) -> int:
+        return self.get_settings().rate_limit_reserve_points
+
+    # Spread a backlog evenly over this many seconds from the start of the run (e.g. the cron interval). 0 disables.
+    def get_spread_backlog_over_seconds(self) -> int:
+        return self.get_settings().spread_backlog_over_seconds
+
+    # How many times posting an outbox entry may fail before it is given up on
+    def get_outbox_max_retries(self) -> int:
+        return self.get_settings().outbox_max_retries
+
+    # Relative importance of each ranking signal when ordering the posting backlog
+    def get_ranking_weights(self) -> Dict[str, float]:
+        return self.get_settings().ranking_weights
+
+    # An article's recency score halves every this many hours
+    def get_ranking_half_life_hours(self) -> float:
+        return self.get_settings().ranking_half_life_hours
+
+    # Maximum articles to post per run, the lowest ranked stay queued. 0 means no limit.
+    def get_max_posts_per_run(self) -> int:
+        return self.get_settings().max_posts_per_run
+
+    # Returns the ranking weight multiplier for a given feed source name (1.0 unless set in feeds.yml)
+    def get_source_weight(self, source_name: str) -> float:
+        source = self.get_sources().by_name.get(source_name)
+        return source.weight if source else 1.0
+
+    # Seconds between runs of each --daemon job. The chat check runs every "chat_min" seconds after a command and backs
+    # off to "chat" seconds while the chat is quiet
+    def get_daemon_intervals(self) -> Dict[str, int]:
+        return self.get_settings().daemon_intervals
+
+    # Whether RSS feeds are polled on their own learned schedule instead of on every run (off by default)
+    def get_adaptive_feed_polling(self) -> bool:
+        return self.get_settings().adaptive_feed_polling
+
+    # The shortest ("min") and longest ("max") seconds between polls of a feed with adaptive polling
+    def get_feed_poll_intervals(self) -> Dict[str, int]:
+        return self.get_settings().feed_poll_intervals
+
+    # Consecutive failures after which a source is skipped for a while, 0 to always try every source
+    def get_source_failure_threshold(self) -> int:
+        return self.get_settings().source_failure_threshold
+
+    # How long a failing source is first skipped ("base", doubling with each failed retry) and at most ("max"), seconds
+    def get_source_backoff_seconds(self) -> Dict[str, int]:
+        return self.get_settings().source_backoff_seconds
+
+    # Seconds a single run may take before it starts leaving work for the next one, 0 (the default) for no limit
+    def get_run_budget_seconds(self) -> int:
+        return self.get_settings().run_budget_seconds
+
+    # The soft deadline of each stage ("fetch", "filter", "summaries", "thumbnails", "post") as a share of the budget
+    def get_run_budget_deadlines(self) -> Dict[str, float]:
+        return self.get_settings().run_budget_deadlines
+
+    # Port of the localhost control endpoint in --daemon mode, 0 (the default) to not start it
+    def get_control_port(self) -> int:
+        return self.get_settings().control_port
+
+    # Requests to the control endpoint need an "Authorization: Bearer <token>" header; without one it is not started
+    def get_control_token(self) -> str:
+        return self.get_settings().control_token
+
+    def export_metrics(self) -> None:
+        """Write the metrics collected so far to the Prometheus textfile and JSON summary set in config.yml, if any."""
+        settings = self.get_settings()
+        try:
+            self.metrics.export(settings.metrics_textfile, settings.metrics_summary_file)
+        except OSError as e:
+            self.logger.warning(f"Could not write metrics: {e}")
+
+    # Number of posts committed per applyWrites call. 1 (the default) posts articles one at a time.
+    def get_posts_per_batch(self) -> int:
+        return self.get_settings().posts_per_batch
     
     def save_config(self, path: str, data: Dict[str, Any]) -> None:
-        with open(path, "w", encoding="utf-8") as f:
-            yaml.dump(data, f, default_flow_style=False, allow_unicode=True)
-            self.logger.debug(f"Saved updated config to {path}")
+        for key, config_path in CONFIG_FILES.items():
+            if config_path == path:
+                # the change is already in memory, only the derived structures need rebuilding
+                self.__derived.pop(key, None)
+        if self.__pending_writes is not None:
+            # inside batched_writes(): written once when the batch ends
+            self.__pending_writes[path] = data
+            return
+        self.__write_config(path, data)
+
+    @contextmanager
+    def batched_writes(self) -> Iterator[None]:
+        """Coalesce every save_config call made inside the block into one write per file when the block ends."""
+        if self.__pending_writes is not None:
+            yield
+            return
+        self.__pending_writes = {}
+        try:
+            yield
+        finally:
+            pending, self.__pending_writes = self.__pending_writes, None
+            for path, data in pending.items():
+                self.__write_config(path, data)
+
+    def __write_config(self, path: str, data: Dict[str, Any]) -> None:
+        content = yaml.dump(data, Dumper=YAML_DUMPER, default_flow_style=False, allow_unicode=True).encode("utf-8")
+        # write a temp file next to the config and rename it over the original, so a crash never leaves it truncated
+        directory = os.path.dirname(path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file private to us, keep the permissions the config file already had
+            if os.path.exists(path):
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.logger.debug(f"Saved updated config to {path}")
+        for key, config_path in CONFIG_FILES.items():
+            if config_path == path:
+                # our own write must not look like an outside edit to reload_if_changed()
+                self.__file_stamps[key] = stamp_bytes(os.stat(path), content)
+                self.__config_cache.entries[path] = (self.__file_stamps[key], data)
+                self.__config_cache.dirty = True
+                self.__config_cache.save()
 
     def get_saved_session(self) -> str:
+        if self.cassette:
+            # recorded and replayed runs log in with the password, so they make the same requests
+            return ""
         return self.__session["session_string"] if self.__session else ""
     
     def get_pds_url(self) -> str:
         return self.__main_config.get("pds_url", "https://bsky.social")
 
+    # The XRPC endpoint of the PDS, as the atproto Client wants it
+    def get_xrpc_url(self) -> str:
+        pds_url = self.get_pds_url().rstrip("/")
+        return pds_url if pds_url.endswith("/xrpc") else f"{pds_url}/xrpc"
+
     def save_session(self) -> None:
+        if self.cassette and self.cassette.mode == "replay":
+            # a replayed session is only good for the replay
+            return
         session_string = self.get_bsky_account().session_string
+        if self.__session and self.__session.get("session_string") == session_string:
+            # the daemon saves after every step, only write when the session was refreshed
+            return
         self.__session = {"session_string": session_string}
         self.save_config("config/session.yml", self.__session)
 
@@ -0,0 +1,223 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict
+from src.keywords import KeywordMatcher
+
+# Typed, validated views of the config files. Each one is built once when its file is (re)loaded, so hot paths do
+# attribute and dictionary lookups instead of scanning and re-validating the raw YAML.
+
+# the PDS rejects applyWrites calls with more writes than this
+MAX_WRITES_PER_BATCH = 200
+DEFAULT_RANKING_WEIGHTS = {"recency": 1.0, "ai_score": 1.0, "good_words": 0.5, "tags": 0.25}
+# soft deadline of each stage as a share of run_budget_seconds
+DEFAULT_RUN_BUDGET_DEADLINES = {"fetch": 0.35, "filter": 0.5, "summaries": 0.6, "thumbnails": 0.7, "post": 0.9}
+
+
+# One feed or website from feeds.yml
+@dataclass(frozen=True)
+class SourceConfig:
+    key: str
+    kind: str  # "rss" or "html"
+    name: str
+    url: str
+    tag: str
+    default_image: str = ""
+    weight: float = 1.0
+    # per-feed bounds for adaptive polling, 0 to use the ones from config.yml
+    poll_min_interval: int = 0
+    poll_max_interval: int = 0
+
+
+# Every source from feeds.yml, in file order and by name
+@dataclass(frozen=True)
+class Sources:
+    rss: tuple[SourceConfig, ...]
+    html: tuple[SourceConfig, ...]
+    by_name: Dict[str, SourceConfig]
+
+
+# The validated settings from config.yml
+@dataclass(frozen=True)
+class Settings:
+    log_level: str
+    max_articles_per_feed: int
+    max_article_age_days: int
+    ai_filter_quality_threshold: float
+    delay_between_posts: float
+    min_delay_between_posts: float
+    rate_limit_reserve_points: int
+    spread_backlog_over_seconds: int
+    posts_per_batch: int
+    outbox_max_retries: int
+    ranking_weights: Dict[str, float]
+    ranking_half_life_hours: float
+    max_posts_per_run: int
+    daemon_intervals: Dict[str, int]
+    control_port: int
+    control_token: str
+    metrics_textfile: str
+    metrics_summary_file: str
+    adaptive_feed_polling: bool
+    feed_poll_intervals: Dict[str, int]
+    source_failure_threshold: int
+    source_backoff_seconds: Dict[str, int]
+    run_budget_seconds: int
+    run_budget_deadlines: Dict[str, float]
+
+
+# Compiled matchers for the filter.yml word lists
+@dataclass(frozen=True)
+class KeywordSets:
+    super_bad_words: KeywordMatcher
+    bad_words: KeywordMatcher
+    good_words: KeywordMatcher
+
+
+# Compiled matchers and display strings for the tags.yml keywords
+@dataclass(frozen=True)
+class TagSets:
+    matchers: Dict[str, KeywordMatcher]
+    keyword_strings: Dict[str, str]
+
+
+def _number(config: Dict[str, Any], key: str, default: Any, kind: type, minimum: float | None = None) -> Any:
+    value = config.get(key, default)
+    if value is None:
+        value = default
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} in config must be {'an integer' if kind is int else 'a number'}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{key} in config must be at least {minimum}")
+    return value
+
+
+def _build_source(key: str, kind: str, data: Any) -> SourceConfig:
+    if not isinstance(data, dict) or not all(data.get(field) for field in ("name", "url", "tag")):
+        raise ValueError(f"source '{key}' in feeds.yml must have a name, url and tag")
+    return SourceConfig(
+        key=key,
+        kind=kind,
+        name=str(data["name"]),
+        url=str(data["url"]),
+        tag=str(data["tag"]),
+        default_image=str(data.get("defaultimage", "") or ""),
+        weight=_number(data, "weight", 1.0, float, 0),
+        poll_min_interval=_number(data, "poll_min_interval_seconds", 0, int, 0),
+        poll_max_interval=_number(data, "poll_max_interval_seconds", 0, int, 0),
+    )
+
+
+def build_sources(feed_config: Dict[str, Any]) -> Sources:
+    sections = {}
+    for section, kind in (("rss_feeds", "rss"), ("html_sources", "html")):
+        entries = feed_config.get(section, {}) or {}
+        if not isinstance(entries, dict):
+            raise ValueError(f"{section} in config must be a mapping")
+        sections[kind] = tuple(_build_source(key, kind, data) for key, data in entries.items())
+
+    by_name = {}
+    # RSS feeds win if a name is used twice, like the old linear scan
+    for source in sections["html"] + sections["rss"]:
+        by_name[source.name] = source
+    return Sources(rss=sections["rss"], html=sections["html"], by_name=by_name)
+
+
+def _build_ranking_weights(main_config: Dict[str, Any]) -> Dict[str, float]:
+    weights = dict(DEFAULT_RANKING_WEIGHTS)
+    configured = main_config.get("ranking_weights", {}) or {}
+    if not isinstance(configured, dict):
+        raise ValueError("ranking_weights in config must be a mapping")
+    for key, value in configured.items():
+        if key not in weights:
+            raise ValueError(f"unknown ranking weight '{key}' in config, expected one of {list(weights)}")
+        weights[key] = float(value)
+    return weights
+
+
+def _build_run_budget_deadlines(main_config: Dict[str, Any]) -> Dict[str, float]:
+    deadlines = dict(DEFAULT_RUN_BUDGET_DEADLINES)
+    configured = main_config.get("run_budget_deadlines", {}) or {}
+    if not isinstance(configured, dict):
+        raise ValueError("run_budget_deadlines in config must be a mapping")
+    for key in configured:
+        if key not in deadlines:
+            raise ValueError(f"unknown run_budget_deadlines stage '{key}' in config, expected one of {list(deadlines)}")
+        deadlines[key] = _number(configured, key, deadlines[key], float, 0)
+        if deadlines[key] > 1:
+            raise ValueError(f"{key} in run_budget_deadlines must be a share of the budget, between 0 and 1")
+    return deadlines
+
+
+def build_settings(main_config: Dict[str, Any]) -> Settings:
+    log_level = main_config.get("log_level", "INFO")
+    if not isinstance(log_level, str):
+        raise ValueError("log_level in config must be a string")
+    max_articles = main_config.get("max_articles_per_feed", 10)
+    if not isinstance(max_articles, int):
+        raise ValueError("max_articles in config must be an integer")
+    threshold = main_config.get("ai_filter_quality_threshold", 0.6)
+    try:
+        threshold = max(0.0, min(1.0, float(threshold)))  # Clamp to 0-1
+    except (ValueError, TypeError):
+        threshold = 0.6
+    chat_interval = _number(main_config, "daemon_chat_interval_seconds", 60, int, 1)
+    backoff = _number(main_config, "source_backoff_seconds", 300, int, 1)
+    poll_min = _number(main_config, "feed_poll_min_interval_seconds", 600, int, 1)
+    half_life = _number(main_config, "ranking_half_life_hours", 6, float)
+    if half_life <= 0:
+        raise ValueError("ranking_half_life_hours in config must be positive")
+
+    return Settings(
+        log_level=log_level,
+        max_articles_per_feed=max_articles,
+        max_article_age_days=_number(main_config, "max_article_age_days", 10, int),
+        ai_filter_quality_threshold=threshold,
+        delay_between_posts=_number(main_config, "delay_between_posts_in_seconds", 3, float, 0),
+        min_delay_between_posts=_number(main_config, "min_delay_between_posts_in_seconds", 1, float, 0),
+        rate_limit_reserve_points=_number(main_config, "rate_limit_reserve_points", 30, int, 0),
+        spread_backlog_over_seconds=_number(main_config, "spread_backlog_over_seconds", 0, int, 0),
+        posts_per_batch=min(_number(main_config, "posts_per_batch", 1, int, 1), MAX_WRITES_PER_BATCH),
+        outbox_max_retries=_number(main_config, "outbox_max_retries", 3, int, 1),
+        ranking_weights=_build_ranking_weights(main_config),
+        ranking_half_life_hours=half_life,
+        max_posts_per_run=_number(main_config, "max_posts_per_run", 0, int, 0),
+        daemon_intervals={
+            "fetch": _number(main_config, "daemon_fetch_interval_seconds", 900, int, 1),
+            "post": _number(main_config, "daemon_post_interval_seconds", 60, int, 1),
+            "chat": chat_interval,
+            "chat_min": min(_number(main_config, "daemon_chat_min_interval_seconds", 10, int, 1), chat_interval),
+        },
+        control_port=_number(main_config, "control_port", 0, int, 0),
+        control_token=str(main_config.get("control_token", "") or ""),
+        metrics_textfile=str(main_config.get("metrics_textfile", "") or ""),
+        metrics_summary_file=str(main_config.get("metrics_summary_file", "") or ""),
+        adaptive_feed_polling=bool(main_config.get("adaptive_feed_polling", False)),
+        feed_poll_intervals={
+            "min": poll_min,
+            "max": max(_number(main_config, "feed_poll_max_interval_seconds", 21600, int, 1), poll_min),
+        },
+        source_failure_threshold=_number(main_config, "source_failure_threshold", 3, int, 0),
+        source_backoff_seconds={
+            "base": backoff,
+            "max": max(_number(main_config, "source_max_backoff_seconds", 86400, int, 1), backoff),
+        },
+        run_budget_seconds=_number(main_config, "run_budget_seconds", 0, int, 0),
+        run_budget_deadlines=_build_run_budget_deadlines(main_config),
+    )
+
+
+def build_keyword_sets(super_bad_words: list[str], bad_words: list[str], good_words: list[str]) -> KeywordSets:
+    return KeywordSets(
+        super_bad_words=KeywordMatcher(super_bad_words),
+        bad_words=KeywordMatcher(bad_words),
+        good_words=KeywordMatcher(good_words),
+    )
+
+
+def build_tag_sets(tags_config: Dict[str, list[str]]) -> TagSets:
+    return TagSets(
+        matchers={tag: KeywordMatcher(keywords or []) for tag, keywords in tags_config.items()},
+        keyword_strings={tag: "|".join(keywords) for tag, keywords in tags_config.items() if keywords},
+    )
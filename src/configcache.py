@@ -0,0 +1,88 @@
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+import yaml
+
+CACHE_PATH = Path("data/config_cache.pickle")
+# libyaml's loader is several times faster than the pure-Python one when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# (mtime in ns, size, sha1 of the contents) of a config file
+Stamp = tuple[int, int, str]
+
+
+def stamp_bytes(stat: os.stat_result, content: bytes) -> Stamp:
+    return stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest()
+
+
+def stamp_file(path: str) -> Stamp | None:
+    try:
+        with open(path, "rb") as f:
+            return stamp_bytes(os.fstat(f.fileno()), f.read())
+    except FileNotFoundError:
+        return None
+
+
+# ConfigCache keeps the parsed contents of the YAML config files in a pickle, keyed by each file's stamp, so a run
+# whose config files haven't changed since the last one skips YAML parsing entirely
+class ConfigCache:
+    def __init__(self, path: Path = CACHE_PATH):
+        self.path = path
+        self.dirty = False
+        self.entries: Dict[str, tuple[Stamp, Any]] = {}
+        try:
+            with open(self.path, "rb") as f:
+                entries = pickle.load(f)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+            # missing or unreadable (e.g. written by another Python version): start over
+            pass
+
+    def load(self, path: str) -> tuple[Any, Stamp | None]:
+        """Return the parsed contents and stamp of a YAML file, parsing it only if it changed since it was cached."""
+        entry = self.entries.get(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None, None
+        # same mtime and size: trust the cache without reading the file
+        if entry is not None and entry[0][:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[1], entry[0]
+
+        with open(path, "rb") as f:
+            content = f.read()
+            stamp = stamp_bytes(os.fstat(f.fileno()), content)
+        if entry is not None and entry[0][2] == stamp[2]:
+            # touched but not changed
+            data = entry[1]
+        else:
+            data = yaml.load(content, Loader=YAML_LOADER)
+        self.entries[path] = (stamp, data)
+        self.dirty = True
+        return data, stamp
+
+    def save(self) -> None:
+        """Write the cache back if anything was parsed or re-stamped since it was read."""
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        except OSError:
+            # the cache is only an optimisation
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except (OSError, pickle.PickleError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
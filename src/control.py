@@ -0,0 +1,204 @@
+from __future__ import annotations
+import hmac
+import json
+import queue
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, TYPE_CHECKING
+from urllib.parse import parse_qs, urlparse
+from src.commands import CommandHandler, CommandResponse
+from src.latency import DEFAULT_REPORT_DAYS, latency_report
+if TYPE_CHECKING:
+    from src.config import Config
+
+CONTROL_HOST = "127.0.0.1"
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# how long a POST /command waits for the daemon to get to it before answering 202 Accepted
+COMMAND_TIMEOUT_SECONDS = 60
+MAX_BODY_BYTES = 64 * 1024
+
+
+# A command sent over HTTP, waiting for the daemon's main thread to run it
+@dataclass
+class PendingCommand:
+    text: str
+    done: threading.Event = field(default_factory=threading.Event)
+    response: CommandResponse | None = None
+    ran: bool = False
+
+
+# ControlServer is a localhost-only HTTP alternative to the admin chat, for operators and scripts:
+#   POST /command   {"command": "/addbadwords word"}, runs the same commands as the chat
+#   GET  /excluded  recently excluded article URLs
+#   GET  /queue     articles in the outbox, optionally ?state=pending
+#   GET  /stats     outbox counts, posting and rate limit state, daemon jobs
+#   GET  /latency   p50/p95 seconds from first seen and from published to posted, per source, optionally ?days=7
+# Lists take ?limit=&offset= and return next_offset, which is null on the last page. Commands change the config, so
+# they are queued and run by the daemon between steps (process_pending); the read-only endpoints answer directly.
+# Every request needs the control token. Requests from browsers (with an Origin header) and commands that are not
+# JSON are refused, so a web page can't reach the endpoint through a simple cross-origin POST or DNS rebinding.
+class ControlServer:
+    def __init__(self, config: Config, stats: Callable[[], dict[str, Any]] | None = None):
+        self.config = config
+        self.logger = config.get_logger()
+        self.stats = stats
+        # read here, on the thread that owns the config, so the request threads never touch it
+        self.token = config.get_control_token()
+        if not self.token:
+            raise ValueError("control_token must be set to use control_port")
+        self.post_scheduler = config.get_bsky_account().post_scheduler
+        self.command_handler = CommandHandler(config)
+        self.pending: queue.Queue[PendingCommand] = queue.Queue()
+        self.httpd = ThreadingHTTPServer((CONTROL_HOST, config.get_control_port()), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="control-server", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        self.logger.info(f" Control endpoint listening on http://{CONTROL_HOST}:{self.httpd.server_address[1]}")
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        # anything still waiting gets its 202 right away
+        while not self.pending.empty():
+            self.pending.get_nowait().done.set()
+
+    def process_pending(self, config: Config | None = None) -> bool:
+        """Run the commands received since the last call. Must be called from the thread that owns the config."""
+        did_something = False
+        with self.config.batched_writes():
+            while True:
+                try:
+                    command = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    command.response = self.command_handler.parse_commands(command.text)
+                except Exception as e:
+                    self.logger.exception(f"Error running control command {command.text}: {e}")
+                    command.response = CommandResponse(False, f"Error: {e}")
+                self.logger.info(f" Ran control command: {command.text}")
+                command.ran = True
+                command.done.set()
+                did_something = True
+        return did_something
+
+    def run_command(self, text: str) -> tuple[int, dict[str, Any]]:
+        command = PendingCommand(text)
+        self.pending.put(command)
+        if not command.done.wait(COMMAND_TIMEOUT_SECONDS) or not command.ran:
+            # still runs when the daemon gets to it, unless it is stopping
+            return 202, {"queued": True}
+        if command.response is None:
+            return 400, {"success": False, "response": "Unknown command, send /help for a list"}
+        return 200, {"success": command.response.success, "response": command.response.response}
+
+    def get(self, path: str, params: dict[str, str]) -> tuple[int, dict[str, Any]]:
+        db = self.config.db
+        limit, offset = _page(params)
+        if path == "/excluded":
+            # one extra row tells whether there is another page
+            rows = db.get_recently_excluded_articles(limit + 1, offset)
+            return 200, _paginated(rows, limit, offset)
+        if path == "/queue":
+            states = params["state"].split(",") if params.get("state") else None
+            rows = db.get_outbox_page(limit + 1, offset, states)
+            return 200, _paginated(rows, limit, offset)
+        if path == "/stats":
+            scheduler = self.post_scheduler
+            stats = {
+                "outbox": db.count_outbox_entries(),
+                "posted_last_24h": db.count_posts_since(24),
+                "rate_limit": {"remaining": scheduler.remaining, "limit": scheduler.limit,
+                               "seconds_until_reset": round(scheduler.seconds_until_reset())},
+            }
+            if self.stats:
+                stats.update(self.stats())
+            return 200, stats
+        if path == "/latency":
+            try:
+                days = float(params.get("days", DEFAULT_REPORT_DAYS))
+            except ValueError:
+                return 400, {"error": "days must be a number"}
+            return 200, latency_report(db, days)
+        return 404, {"error": f"unknown path {path}"}
+
+    def authorized(self, header: str | None) -> bool:
+        return header is not None and hmac.compare_digest(header.encode(), f"Bearer {self.token}".encode())
+
+
+def _page(params: dict[str, str]) -> tuple[int, int]:
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+        offset = int(params.get("offset", 0))
+    except ValueError:
+        limit, offset = DEFAULT_PAGE_SIZE, 0
+    return max(1, min(limit, MAX_PAGE_SIZE)), max(0, offset)
+
+
+def _paginated(rows: list, limit: int, offset: int) -> dict[str, Any]:
+    return {"items": rows[:limit], "offset": offset, "limit": limit,
+            "next_offset": offset + limit if len(rows) > limit else None}
+
+
+def _make_handler(server: ControlServer) -> type[BaseHTTPRequestHandler]:
+    class ControlRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.check_auth():
+                return
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                self.reply(*server.get(url.path, params))
+            except Exception as e:
+                server.logger.exception(f"Error answering control request {self.path}: {e}")
+                self.reply(500, {"error": str(e)})
+
+        def do_POST(self):
+            if not self.check_auth():
+                return
+            if urlparse(self.path).path != "/command":
+                self.reply(404, {"error": f"unknown path {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.reply(413, {"error": "request too large"})
+                return
+            if (self.headers.get("Content-Type") or "").split(";")[0].strip().lower() != "application/json":
+                self.reply(415, {"error": "expected Content-Type: application/json"})
+                return
+            body = self.rfile.read(length).decode("utf-8", errors="replace")
+            try:
+                text = json.loads(body).get("command", "")
+            except (ValueError, AttributeError):
+                self.reply(400, {"error": "expected a JSON object with a command"})
+                return
+            if not isinstance(text, str) or not text.strip():
+                self.reply(400, {"error": "no command given"})
+                return
+            self.reply(*server.run_command(text.strip()))
+
+        def check_auth(self) -> bool:
+            if self.headers.get("Origin") is not None:
+                self.reply(403, {"error": "requests from web pages are not accepted"})
+                return False
+            if server.authorized(self.headers.get("Authorization")):
+                return True
+            self.reply(401, {"error": "missing or wrong token"})
+            return False
+
+        def reply(self, status: int, payload: dict[str, Any]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            server.logger.debug(f"  Control request: {format % args}")
+
+    return ControlRequestHandler
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import signal
+import time
+from dataclasses import dataclass
+from typing import Callable, TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.config import Config
+
+
+# A pipeline step the daemon runs every interval seconds. With a min_interval the job is adaptive: it runs every
+# min_interval seconds after a run that did something (func returned a truthy value) and backs off, doubling the wait
+# up to interval, while there is nothing to do. between_stages jobs also run, when due, in the middle of other jobs.
+@dataclass
+class Job:
+    name: str
+    interval: float
+    func: Callable[[Config], object]
+    next_run: float = 0.0
+    min_interval: float | None = None
+    between_stages: bool = False
+    current_interval: float = 0.0
+
+    def next_interval(self, did_something: bool) -> float:
+        if self.min_interval is None:
+            return self.interval
+        if did_something or not self.current_interval:
+            self.current_interval = self.min_interval
+        else:
+            self.current_interval = min(self.current_interval * 2, self.interval)
+        return self.current_interval
+
+
+# Daemon keeps one Config alive (and with it the Bluesky session, resolved DIDs, AI clients and imported libraries)
+# and runs each job on its own interval instead of paying for a cold start on every cron tick
+class Daemon:
+    def __init__(self, config: Config, jobs: list[Job]):
+        self.config = config
+        self.logger = config.get_logger()
+        self.jobs = jobs
+        self.running: set[str] = set()
+
+    def request_stop(self, signum: int, frame) -> None:
+        self.logger.info(f" Received {signal.Signals(signum).name}, stopping after the current step...")
+        self.config.shutdown.set()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        self.config.stage_hooks.append(self.run_due_between_stages)
+        for job in self.jobs:
+            if job.min_interval is None:
+                self.logger.info(f" Scheduling {job.name} every {job.interval:.0f} seconds")
+            else:
+                self.logger.info(f" Scheduling {job.name} every {job.min_interval:.0f} to {job.interval:.0f} seconds")
+
+        while not self.config.shutdown.is_set():
+            job = min(self.jobs, key=lambda j: j.next_run)
+            wait = job.next_run - time.time()
+            if wait > 0:
+                # wakes up early if a stop is requested
+                self.config.shutdown.wait(wait)
+                continue
+            self.run_job(job)
+
+        self.config.stage_hooks.remove(self.run_due_between_stages)
+        self.config.save_session()
+        self.logger.info(" LocalNewsBot daemon stopped.")
+
+    def stats(self) -> dict[str, object]:
+        """When each job runs next, for status reports."""
+        now = time.time()
+        return {"jobs": {job.name: {"next_run_in_seconds": max(round(job.next_run - now), 0),
+                                    "interval_seconds": job.current_interval or job.interval}
+                         for job in self.jobs}}
+
+    def run_due_between_stages(self) -> None:
+        """Run the between_stages jobs that are due. Called by the pipeline between its steps."""
+        now = time.time()
+        for job in self.jobs:
+            if job.between_stages and job.next_run <= now and job.name not in self.running:
+                self.run_job(job)
+
+    def run_job(self, job: Job) -> None:
+        start_time = time.time()
+        did_something = False
+        self.running.add(job.name)
+        try:
+            # picks up config files edited by hand since the last step
+            self.config.reload_if_changed()
+            did_something = bool(job.func(self.config))
+            self.config.save_session()
+            if not job.between_stages:
+                self.config.export_metrics()
+        except Exception as e:
+            self.logger.exception(f"Error running {job.name}: {e}")
+        finally:
+            self.running.discard(job.name)
+        job.next_run = start_time + job.next_interval(did_something)
+        if did_something or not job.between_stages:
+            # the frequent polling jobs only log when they found something
+            self.logger.debug(f"  {job.name} took {time.time() - start_time:.2f}s, next run in {job.next_run - time.time():.0f}s")
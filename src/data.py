@@ -1,8 +1,48 @@
+from __future__ import annotations
+from dataclasses import dataclass
 from pathlib import Path
+import json
 import sqlite3
 
 DB_PATH = Path("data/database.sqlite")
 
+# Outbox states: articles that passed the filters wait as 'pending', become 'prepared' once their post text has been
+# generated, and end up 'posted' or, after too many failed attempts, 'failed'. Articles caught by a filter added
+# while they were waiting end up 'excluded'.
+OUTBOX_PENDING = "pending"
+OUTBOX_PREPARED = "prepared"
+OUTBOX_POSTED = "posted"
+OUTBOX_FAILED = "failed"
+OUTBOX_EXCLUDED = "excluded"
+
+
+# An article waiting in the outbox
+@dataclass
+class OutboxEntry:
+    id: int
+    article_url: str
+    article: dict
+    post_text: str | None
+    state: str
+    retries: int
+
+# What adaptive polling has learned about an RSS feed, times in unix seconds
+@dataclass
+class FeedState:
+    feed_url: str
+    entry_gap: float | None
+    last_polled_at: float
+    next_poll_at: float
+
+# Recent failures of a feed or website, times in unix seconds. While open_until is in the future the source is skipped
+@dataclass
+class SourceHealth:
+    source_url: str
+    consecutive_failures: int
+    last_error: str
+    last_failure_at: float | None
+    open_until: float | None
+
 # DatabaseManager handles SQLite operations for tracking posted articles. It's a very simple sqlite database that just 
 # records article URLs that have been posted already and the time posted.
 class DatabaseManager:
@@ -36,6 +76,75 @@ class DatabaseManager:
                 """
             )
             
+            # Create outbox table, the durable queue between fetching/filtering and posting
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    article_url TEXT NOT NULL UNIQUE,
+                    article TEXT NOT NULL,
+                    post_text TEXT,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    retries INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state)")
+
+            # Create article_timings table, when each queued article was published, first fetched and posted, so
+            # the time it takes news to reach Bluesky can be reported per source
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS article_timings (
+                    article_url TEXT PRIMARY KEY,
+                    source_name TEXT NOT NULL,
+                    published_at TIMESTAMP,
+                    first_seen_at TIMESTAMP NOT NULL,
+                    posted_at TIMESTAMP
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS article_timings_posted_at ON article_timings (posted_at)")
+
+            # Create feed_state table, the learned publishing rate and poll schedule of each RSS feed
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS feed_state (
+                    feed_url TEXT PRIMARY KEY,
+                    entry_gap REAL,
+                    last_polled_at REAL NOT NULL,
+                    next_poll_at REAL NOT NULL
+                )
+                """
+            )
+
+            # Create source_health table, the circuit breaker state of feeds and websites that have been failing
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS source_health (
+                    source_url TEXT PRIMARY KEY,
+                    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT NOT NULL DEFAULT '',
+                    last_failure_at REAL,
+                    open_until REAL
+                )
+                """
+            )
+
+            # Create state table, small values the bot has to remember between runs (e.g. the chat log cursor)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
             # Migrate existing tables if they have UNIQUE constraint
             self._migrate_tables(conn)
             
@@ -83,7 +192,8 @@ class DatabaseManager:
 
     def _get_connection(self) -> sqlite3.Connection:
         """Return a new sqlite3 connection to the database."""
-        return sqlite3.connect(self.path)
+        # the fetch and post sides may run in different processes, so wait for the other one's write lock
+        return sqlite3.connect(self.path, timeout=30)
     
     def has_posted_article(self, article_url: str) -> bool:
         conn = self._get_connection()
@@ -107,6 +217,18 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def record_posted_articles(self, article_urls: list[str]) -> None:
+        """Record several posted article URLs in a single transaction."""
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                "INSERT INTO posts (article_url) VALUES (?)",
+                [(url,) for url in article_urls]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
     def is_excluded(self, article_url: str) -> bool:
         """Check if an article URL exists in the excluded table."""
         conn = self._get_connection()
@@ -151,14 +273,304 @@ class DatabaseManager:
         finally:
             conn.close()
 
-    def get_recently_excluded_articles(self, limit: int = 10) -> list[str]:
-        """Retrieve a list of recently excluded article URLs."""
+    def get_recently_excluded_articles(self, limit: int = 10, offset: int = 0) -> list[str]:
+        """Retrieve a list of recently excluded article URLs, skipping the offset most recent ones."""
         conn = self._get_connection()
         try:
             cursor = conn.execute(
-                "SELECT article_url FROM excluded ORDER BY excluded_at DESC LIMIT ?",
-                (limit,)
+                "SELECT article_url FROM excluded ORDER BY excluded_at DESC, id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
             )
             return [row[0] for row in cursor.fetchall()]
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+    def enqueue_articles(self, articles: list[tuple[str, dict]]) -> int:
+        """Add (article_url, article data) pairs to the outbox, skipping URLs already queued. Returns the number added."""
+        conn = self._get_connection()
+        try:
+            before = conn.total_changes
+            # an excluded article that passes the filters again (after /refilter) is queued again
+            conn.executemany(
+                """
+                INSERT INTO outbox (article_url, article) VALUES (?, ?)
+                    ON CONFLICT (article_url) DO UPDATE SET
+                        article = excluded.article, post_text = NULL, state = ?, retries = 0, last_error = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE outbox.state = ?
+                """,
+                [(url, json.dumps(data), OUTBOX_PENDING, OUTBOX_EXCLUDED) for url, data in articles]
+            )
+            conn.commit()
+            return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def is_queued(self, article_url: str) -> bool:
+        """
+        Check if an article URL is in the outbox, whether waiting, posted or failed. Only excluded ones can be queued
+        again (see enqueue_articles), so fetching any other would be wasted work.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(
+                "SELECT 1 FROM outbox WHERE article_url = ? AND state != ?",
+                (article_url, OUTBOX_EXCLUDED)
+            )
+            return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
+    def get_outbox_entries(self, limit: int | None = None) -> list[OutboxEntry]:
+        """Retrieve the articles waiting to be posted, oldest first."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(
+                """
+                SELECT id, article_url, article, post_text, state, retries FROM outbox
+                    WHERE state IN (?, ?)
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                (OUTBOX_PENDING, OUTBOX_PREPARED, -1 if limit is None else limit)
+            )
+            return [OutboxEntry(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5]) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def mark_outbox_prepared(self, entry_id: int, post_text: str) -> None:
+        """Store the generated post text so a retry does not have to generate it again."""
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                "UPDATE outbox SET state = ?, post_text = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (OUTBOX_PREPARED, post_text, entry_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_outbox_posted(self, entry_ids: list[int]) -> None:
+        """Mark outbox entries as posted and record their URLs in the posts table, in one transaction."""
+        if not entry_ids:
+            return
+        conn = self._get_connection()
+        try:
+            placeholders = ",".join("?" * len(entry_ids))
+            conn.execute(
+                f"INSERT INTO posts (article_url) SELECT article_url FROM outbox WHERE id IN ({placeholders})",
+                entry_ids
+            )
+            conn.execute(
+                f"UPDATE outbox SET state = ?, updated_at = CURRENT_TIMESTAMP WHERE id IN ({placeholders})",
+                [OUTBOX_POSTED, *entry_ids]
+            )
+            conn.execute(
+                f"""
+                UPDATE article_timings SET posted_at = CURRENT_TIMESTAMP
+                    WHERE posted_at IS NULL AND article_url IN (SELECT article_url FROM outbox WHERE id IN ({placeholders}))
+                """,
+                entry_ids
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_outbox_failed(self, entry_id: int, error: str, max_retries: int) -> bool:
+        """Count a failed attempt. The entry stays queued until it has failed max_retries times. Returns True if it gave up."""
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                """
+                UPDATE outbox SET
+                    retries = retries + 1,
+                    last_error = ?,
+                    state = CASE
+                        WHEN retries + 1 >= ? THEN ?
+                        WHEN post_text IS NULL THEN ?
+                        ELSE ?
+                    END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (error, max_retries, OUTBOX_FAILED, OUTBOX_PENDING, OUTBOX_PREPARED, entry_id)
+            )
+            conn.commit()
+            cursor = conn.execute("SELECT state FROM outbox WHERE id = ?", (entry_id,))
+            row = cursor.fetchone()
+            return row is not None and row[0] == OUTBOX_FAILED
+        finally:
+            conn.close()
+
+    def mark_outbox_excluded(self, entry_id: int) -> None:
+        """Take an article out of the outbox and record it as excluded, in one transaction."""
+        conn = self._get_connection()
+        try:
+            conn.execute("INSERT INTO excluded (article_url) SELECT article_url FROM outbox WHERE id = ?", (entry_id,))
+            conn.execute(
+                "UPDATE outbox SET state = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (OUTBOX_EXCLUDED, entry_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_outbox_page(self, limit: int, offset: int = 0, states: list[str] | None = None) -> list[dict]:
+        """Retrieve outbox entries newest first, with their headline and source, for reporting."""
+        conn = self._get_connection()
+        try:
+            where, params = "", []
+            if states:
+                where = f"WHERE state IN ({','.join('?' * len(states))})"
+                params = list(states)
+            cursor = conn.execute(
+                f"""
+                SELECT id, article_url, article, state, retries, last_error, enqueued_at, updated_at FROM outbox
+                    {where}
+                    ORDER BY id DESC
+                    LIMIT ? OFFSET ?
+                """,
+                (*params, limit, offset)
+            )
+            entries = []
+            for row in cursor.fetchall():
+                article = json.loads(row[2])
+                entries.append({
+                    "id": row[0], "article_url": row[1], "headline": article.get("headline", ""),
+                    "source_name": article.get("source_name", ""), "state": row[3], "retries": row[4],
+                    "last_error": row[5], "enqueued_at": row[6], "updated_at": row[7],
+                })
+            return entries
+        finally:
+            conn.close()
+
+    def count_posts_since(self, hours: float) -> int:
+        """Count the articles posted in the last hours."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(
+                "SELECT COUNT(*) FROM posts WHERE posted_at >= datetime('now', ?)",
+                (f"-{hours} hours",)
+            )
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def record_articles_seen(self, articles: list[tuple[str, str, float | None]], seen_at: float) -> None:
+        """Remember when (article_url, source_name, published unix time) articles were first fetched, keeping earlier sightings."""
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO article_timings (article_url, source_name, published_at, first_seen_at)
+                    VALUES (?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'))
+                """,
+                [(url, source_name, published, seen_at) for url, source_name, published in articles]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_post_latencies(self, days: float) -> list[tuple[str, float, float | None]]:
+        """(source_name, seconds from first seen to posted, seconds from published to posted) for articles posted in the last days."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(
+                """
+                SELECT source_name,
+                       (julianday(posted_at) - julianday(first_seen_at)) * 86400,
+                       (julianday(posted_at) - julianday(published_at)) * 86400
+                    FROM article_timings
+                    WHERE posted_at >= datetime('now', ?)
+                """,
+                (f"-{days * 86400:.0f} seconds",)
+            )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def count_outbox_entries(self) -> dict[str, int]:
+        """Count outbox entries by state."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state")
+            return {state: count for state, count in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def get_feed_states(self) -> dict[str, FeedState]:
+        """Retrieve the poll schedule of every RSS feed polled so far, by URL."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT feed_url, entry_gap, last_polled_at, next_poll_at FROM feed_state")
+            return {row[0]: FeedState(*row) for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def save_feed_states(self, states: list[FeedState]) -> None:
+        """Store the poll schedules of RSS feeds, in one transaction."""
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO feed_state (feed_url, entry_gap, last_polled_at, next_poll_at) VALUES (?, ?, ?, ?)",
+                [(state.feed_url, state.entry_gap, state.last_polled_at, state.next_poll_at) for state in states]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_source_health(self) -> dict[str, SourceHealth]:
+        """Retrieve the failure state of every source that has failed since it last worked, by URL."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(
+                "SELECT source_url, consecutive_failures, last_error, last_failure_at, open_until FROM source_health"
+            )
+            return {row[0]: SourceHealth(*row) for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def save_source_health(self, failing: list[SourceHealth], recovered: list[str]) -> None:
+        """Store the state of failing sources and forget recovered ones, in one transaction."""
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO source_health (source_url, consecutive_failures, last_error, last_failure_at, open_until)
+                    VALUES (?, ?, ?, ?, ?)
+                """,
+                [(h.source_url, h.consecutive_failures, h.last_error, h.last_failure_at, h.open_until) for h in failing]
+            )
+            conn.executemany("DELETE FROM source_health WHERE source_url = ?", [(url,) for url in recovered])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_state(self, key: str) -> str | None:
+        """Retrieve a value remembered between runs, or None if it was never set."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT value FROM state WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def set_states(self, values: dict[str, str | None]) -> None:
+        """Remember values between runs, in one transaction. A value of None forgets the key."""
+        conn = self._get_connection()
+        try:
+            for key, value in values.items():
+                if value is None:
+                    conn.execute("DELETE FROM state WHERE key = ?", (key,))
+                else:
+                    conn.execute(
+                        """
+                        INSERT INTO state (key, value) VALUES (?, ?)
+                            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+                        """,
+                        (key, value)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
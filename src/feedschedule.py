@@ -0,0 +1,79 @@
+from __future__ import annotations
+import time
+from src.data import FeedState
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.config import Config
+    from src.config_snapshot import SourceConfig
+
+# a feed is polled this share of its average gap between entries after the last poll, so a new entry waits about a
+# quarter of the gap on average
+POLL_FRACTION = 0.5
+# weight of the newest observation in the running average of the gap between entries
+GAP_SMOOTHING = 0.3
+# feeds due within this many seconds are polled now rather than a whole run later
+DUE_SLACK_SECONDS = 60
+# entries dated further in the future than this are ignored, feeds get their time zones wrong
+MAX_CLOCK_SKEW_SECONDS = 3600
+
+
+# FeedScheduler decides which RSS feeds are due with adaptive polling on, and learns from each poll how often a feed
+# publishes: the average gap between the entries in the feed, or the time since its newest entry if it has gone
+# quiet for longer than that, smoothed over polls. The next poll is a fraction of that gap later, within the min and
+# max interval (from config.yml or the feed's own settings in feeds.yml). Feeds that fail or have no dates are
+# polled again after the minimum interval.
+class FeedScheduler:
+    def __init__(self, config: Config):
+        self.config = config
+        self.intervals = config.get_feed_poll_intervals()
+        self.states = config.db.get_feed_states()
+        self.updated: list[FeedState] = []
+
+    def bounds(self, source: SourceConfig) -> tuple[int, int]:
+        minimum = source.poll_min_interval or self.intervals["min"]
+        maximum = source.poll_max_interval or self.intervals["max"]
+        return minimum, max(maximum, minimum)
+
+    def is_due(self, source: SourceConfig, now: float | None = None) -> bool:
+        state = self.states.get(source.url)
+        if state is None:
+            return True
+        now = time.time() if now is None else now
+        # a lower maximum set since the last poll applies right away
+        next_poll_at = min(state.next_poll_at, state.last_polled_at + self.bounds(source)[1])
+        return next_poll_at <= now + DUE_SLACK_SECONDS
+
+    def record_poll(self, source: SourceConfig, entry_times: list[float], now: float | None = None) -> FeedState:
+        """Learn from the publication times of all the entries in the feed, and schedule its next poll."""
+        now = time.time() if now is None else now
+        previous = self.states.get(source.url)
+        gap = previous.entry_gap if previous else None
+        times = sorted(t for t in entry_times if t <= now + MAX_CLOCK_SKEW_SECONDS)
+        if times:
+            # the silence since the latest entry counts too: it is all there is for a feed that only lists that one
+            observed = now - times[-1]
+            if len(times) >= 2:
+                observed = max((times[-1] - times[0]) / (len(times) - 1), observed)
+            gap = observed if gap is None else (1 - GAP_SMOOTHING) * gap + GAP_SMOOTHING * observed
+
+        minimum, maximum = self.bounds(source)
+        interval = minimum if gap is None else min(max(gap * POLL_FRACTION, minimum), maximum)
+        state = FeedState(source.url, gap, now, now + interval)
+        self.states[source.url] = state
+        self.updated.append(state)
+        self.config.logger.debug(f"  {source.name}: " + (f"an entry every {gap / 3600:.1f}h, " if gap else "") +
+                                 f"next poll in {interval / 60:.0f} minutes")
+        return state
+
+    def record_failure(self, source: SourceConfig, now: float | None = None) -> None:
+        """Try a feed that could not be fetched again after the minimum interval, keeping what was learned."""
+        now = time.time() if now is None else now
+        previous = self.states.get(source.url)
+        state = FeedState(source.url, previous.entry_gap if previous else None, now, now + self.bounds(source)[0])
+        self.states[source.url] = state
+        self.updated.append(state)
+
+    def save(self) -> None:
+        if self.updated:
+            self.config.db.save_feed_states(self.updated)
+            self.updated = []
@@ -1,9 +1,16 @@
+from __future__ import annotations
 import datetime
 import logging
+import time
 import newspaper
-from src.config import Config
+import src.timestamps as timestamps
 from src.bsky_post import BskyPost
+from src.metrics import SIZE_BUCKETS
 from newspaper import Article as HTMLArticle
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.circuitbreaker import SourceCircuitBreaker
+    from src.config import Config
 
 # WebNewsSource handles parsing news articles from HTML sources using the newspaper3k library
 class WebNewsSource:
@@ -12,30 +19,57 @@ class WebNewsSource:
         self._url = url
         self._tag = tag
         self.config = config
+        # whether the front page could be downloaded at the last fetch, and why not
+        self.fetched = False
+        self.error = ""
 
     def get_articles(self) -> list[BskyPost]:
         return self.parse_website()
 
     def parse_website(self) -> list[BskyPost]:
-        news_site = newspaper.build(self._url, memorize_articles=True)
+        metrics = self.config.metrics
+        try:
+            with metrics.timer("fetch_seconds", source=self._name):
+                news_site = newspaper.build(self._url, memorize_articles=True)
+        except Exception as e:
+            logging.getLogger("htmlsource").warning(f"Failed to download HTML source {self._name}: {e}")
+            metrics.inc("fetch_errors_total", source=self._name)
+            self.error = str(e)
+            return []
+        # newspaper logs and swallows download errors, leaving the page empty
+        if not news_site.html:
+            metrics.inc("fetch_errors_total", source=self._name)
+            self.error = "front page could not be downloaded"
+            return []
+        self.fetched = True
         articles = []
         for art in news_site.articles[:10]:  # Limit to first 10 articles for performance
             try:
                 article = HTMLArticle(art.url)
-                article.download()
-                article.parse()
+                with metrics.timer("fetch_seconds", source=self._name):
+                    article.download()
+                metrics.observe("fetch_bytes", len(article.html or ""), SIZE_BUCKETS, source=self._name)
+                with metrics.timer("parse_seconds", source=self._name):
+                    article.parse()
             except Exception as e:
                 logger = logging.getLogger("htmlsource")
                 logger.debug(f"Error processing article: {e}")
+                metrics.inc("fetch_errors_total", source=self._name)
                 continue
 
+            # an article without a publication date stays undated, its created_at shows when it was found
+            published_epoch = None
+            if isinstance(article.publish_date, datetime.datetime):
+                published_epoch = timestamps.from_datetime(article.publish_date)
+            shown_at = published_epoch if published_epoch is not None else int(time.time())
             extracted_article = BskyPost(
                 source_name=self._name,
                 headline=article.title,
                 description=max([article.meta_description or '', article.text], key=len),
                 link=article.url.split('?')[0].split('#')[0],  # Remove query parameters and fragment identifiers for consistency
                 img_url=article.top_image,
-                created_at=article.publish_date.strftime('%a, %d %b %Y %H:%M:%S %z') if isinstance(article.publish_date, datetime.datetime) else datetime.datetime.now().strftime('%a, %d %b %Y %H:%M:%S %z'),
+                created_at=timestamps.format_timestamp(shown_at),
+                published_epoch=published_epoch,
                 tag=self._tag,
                 config=self.config,
             )
@@ -43,20 +77,29 @@ class WebNewsSource:
         return articles
 
 # Parse HTML sources from config and return list of PostableArticle
-def get_html_sources(config: Config) -> list[BskyPost]:
+def get_html_sources(config: Config, breaker: SourceCircuitBreaker | None = None) -> list[BskyPost]:
     sources = []
-    html_sources = config.get_html_sources()
-    for _, source_info in html_sources.items():
-        sources.append(WebNewsSource(source_info["name"], source_info["url"], source_info["tag"], config))
+    for source_config in config.get_html_sources():
+        sources.append((source_config, WebNewsSource(source_config.name, source_config.url, source_config.tag, config)))
 
     articles = []
+    max_articles = config.get_max_articles_per_feed()
 
-    for source in sources:
+    for source_config, source in sources:
+        if config.past_deadline("fetch"):
+            break
+        if breaker and not breaker.allow(source_config):
+            continue
         source_articles = source.get_articles()
+        if breaker:
+            if source.fetched:
+                breaker.record_success(source_config)
+            else:
+                breaker.record_failure(source_config, source.error)
 
         # keep only the first x articles
         if source_articles:
-            source_articles = source_articles[:config.get_max_articles_per_feed()]
+            source_articles = source_articles[:max_articles]
 
         articles.extend(source_articles)
         config.logger.debug(f"Fetched {len(source_articles)} articles from HTML source: {source._name}")
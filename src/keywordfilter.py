@@ -6,15 +6,22 @@ if TYPE_CHECKING:
     from src.config import Config
 
 
+def matches_super_bad_words(article: BskyPost, config: Config) -> bool:
+    """Check an article against the current super bad words, e.g. again right before it is posted."""
+    super_bad_words = config.get_keyword_matcher("super_bad_words")
+    cleaned_url = article.link.replace("/", " ").replace(".", " ").replace("-", " ")
+    return any(super_bad_words.matches(text) for text in (article.headline, article.description, cleaned_url))
+
+
 # KeywordFilter applies keyword-based filtering rules to articles, the traditional filtering approach
 class KeywordFilter(NewsFilter):
     def __init__(self, config: Config):
         super().__init__(config)
 
     def filter(self, articles: list[BskyPost]) -> list[BskyPost]:
-        self.bad_words = self.config.get_bad_words()
-        self.super_bad_words = self.config.get_super_bad_words()
-        good_words = self.config.get_good_words()
+        self.bad_words = self.config.get_keyword_matcher("bad_words")
+        self.super_bad_words = self.config.get_keyword_matcher("super_bad_words")
+        good_words = self.config.get_keyword_matcher("good_words")
         previously_posted = []
 
         for art in articles:
@@ -57,7 +64,7 @@ class KeywordFilter(NewsFilter):
             pass
 
         for article in removed_articles:
-            if any(phrase.lower() in article.headline.lower() for phrase in good_words):
+            if good_words.matches(article.headline):
                 self.logger.debug(f"Restoring due to ok phrase match: {article.headline}")
                 working_articles.append(article)
                 removed_articles.remove(article)
@@ -83,9 +90,9 @@ class KeywordFilter(NewsFilter):
         removed_articles = []
         super_removed_articles = []
         for article in articles:
-            if not any(word.lower() in article.headline.lower() for word in (self.bad_words + self.super_bad_words)):
+            if not (self.bad_words.matches(article.headline) or self.super_bad_words.matches(article.headline)):
                 filtered_articles.append(article)
-            elif any(word.lower() in article.headline.lower() for word in self.super_bad_words):
+            elif self.super_bad_words.matches(article.headline):
                 super_removed_articles.append(article)
                 self.logger.debug(f"Excluding due to headline super filter: {article.headline}")
             else:
@@ -98,9 +105,9 @@ class KeywordFilter(NewsFilter):
         removed_articles = []
         super_removed_articles = []
         for article in articles:
-            if not any(word.lower() in article.description.lower() for word in (self.bad_words + self.super_bad_words)):
+            if not (self.bad_words.matches(article.description) or self.super_bad_words.matches(article.description)):
                 filtered_articles.append(article)
-            elif any(word.lower() in article.description.lower() for word in self.super_bad_words):
+            elif self.super_bad_words.matches(article.description):
                 super_removed_articles.append(article)
                 self.logger.debug(f"Excluding due to body super filter: {article.headline}")
             else:
@@ -115,10 +122,10 @@ class KeywordFilter(NewsFilter):
         for article in articles:
             cleaned_url = article.link.replace("/", " ").replace(".", " ").replace("-", " ")
             self.logger.debug(f"Cleaned URL for filtering: {cleaned_url}")
-            if not any(word.lower() in cleaned_url.lower() for word in (self.bad_words + self.super_bad_words)):
+            if not (self.bad_words.matches(cleaned_url) or self.super_bad_words.matches(cleaned_url)):
                 filtered_articles.append(article)
                 self.logger.debug(f"URL passed filter: {article.link}")
-            elif any(word.lower() in cleaned_url.lower() for word in self.super_bad_words):
+            elif self.super_bad_words.matches(cleaned_url):
                 super_removed_articles.append(article)
                 self.logger.debug(f"Excluding due to URL super filter: {article.headline}")
             else:
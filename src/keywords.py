@@ -0,0 +1,32 @@
+from __future__ import annotations
+import re
+from typing import Iterable
+
+
+# KeywordMatcher does case-insensitive substring matching against a list of keywords with one compiled regex,
+# instead of lowercasing and scanning the text once per keyword
+class KeywordMatcher:
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(str(keyword).lower() for keyword in keywords)
+        # longest first so match() reports the most specific keyword
+        pattern = "|".join(re.escape(keyword) for keyword in sorted(set(self.keywords), key=len, reverse=True))
+        self._regex = re.compile(pattern) if self.keywords else None
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def match(self, text: str) -> str | None:
+        """Return the first keyword found in text (case-insensitive), or None."""
+        if self._regex is None:
+            return None
+        m = self._regex.search(text.lower())
+        return m.group() if m else None
+
+    def matches(self, text: str) -> bool:
+        """Check if any keyword appears in text (case-insensitive)."""
+        return self.match(text) is not None
+
+    def count(self, text: str) -> int:
+        """Count how many different keywords appear in text (case-insensitive)."""
+        text = text.lower()
+        return sum(1 for keyword in set(self.keywords) if keyword in text)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+import math
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.data import DatabaseManager
+
+# how far back --latency-report and GET /latency look by default
+DEFAULT_REPORT_DAYS = 7
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """The nearest-rank percentile of sorted values."""
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def _summarize(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    values = sorted(max(value, 0) for value in values)
+    return {"p50": round(_percentile(values, 0.5)), "p95": round(_percentile(values, 0.95)), "max": round(values[-1])}
+
+
+def latency_report(db: DatabaseManager, days: float = DEFAULT_REPORT_DAYS) -> dict[str, Any]:
+    """Per source, how long articles posted in the last days took from first seen and from published to posted, in seconds."""
+    by_source: dict[str, tuple[list[float], list[float]]] = {}
+    for source_name, seen_to_posted, published_to_posted in db.get_post_latencies(days):
+        seen, published = by_source.setdefault(source_name, ([], []))
+        seen.append(seen_to_posted)
+        # feeds that don't say when an article was published only have the seen to posted time
+        if published_to_posted is not None:
+            published.append(published_to_posted)
+    sources = {
+        name: {"posted": len(seen), "seen_to_posted": _summarize(seen), "published_to_posted": _summarize(published)}
+        for name, (seen, published) in sorted(by_source.items())
+    }
+    return {"days": days, "sources": sources}
+
+
+def _minutes(summary: dict[str, float] | None, width: int) -> str:
+    if summary is None:
+        return f"{'-':>{width}} {'-':>7}"
+    return f"{summary['p50'] / 60:>{width}.1f} {summary['p95'] / 60:7.1f}"
+
+
+def format_latency_report(report: dict[str, Any]) -> str:
+    """The report as a table, in minutes, slowest sources (by p95 from published) first."""
+    sources = report["sources"]
+    if not sources:
+        return f"No articles posted in the last {report['days']:g} days."
+
+    def slowest_first(item: tuple[str, dict]) -> float:
+        summary = item[1]["published_to_posted"] or item[1]["seen_to_posted"]
+        return -summary["p95"]
+    width = max(len("source"), *(len(name) for name in sources))
+    lines = [f"Minutes to post over the last {report['days']:g} days:",
+             f"{'source':<{width}} {'posts':>6}  {'from seen p50':>13} {'p95':>7}  {'from published p50':>18} {'p95':>7}"]
+    for name, stats in sorted(sources.items(), key=slowest_first):
+        lines.append(f"{name:<{width}} {stats['posted']:>6}  {_minutes(stats['seen_to_posted'], 13)}  "
+                     f"{_minutes(stats['published_to_posted'], 18)}")
+    return "\n".join(lines)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+# every exported metric name starts with this
+PREFIX = "localnewsbot_"
+# histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+
+# metric name -> (type, help text) for the metrics the bot records
+METRICS = {
+    "fetch_seconds": ("histogram", "Time to download a feed or page, by source"),
+    "fetch_bytes": ("histogram", "Size of a downloaded feed or page, by source"),
+    "fetch_errors_total": ("counter", "Feeds or pages that could not be downloaded, by source"),
+    "parse_seconds": ("histogram", "Time to parse a downloaded feed or page, by source"),
+    "db_lookup_seconds": ("histogram", "Time to check whether an article was already posted, excluded or queued"),
+    "db_lookups_total": ("counter", "Articles checked against the database"),
+    "articles_total": ("counter", "Articles by pipeline step: fetched, filtered out, queued, posted, failed"),
+    "filter_seconds": ("histogram", "Time spent in a news filter, by filter"),
+    "llm_request_seconds": ("histogram", "Gemini request latency, by purpose"),
+    "llm_tokens_total": ("counter", "Gemini tokens used, by purpose and prompt/output"),
+    "llm_errors_total": ("counter", "Failed Gemini requests, by purpose"),
+    "image_upload_seconds": ("histogram", "Time to upload an embed card thumbnail"),
+    "image_upload_bytes": ("histogram", "Size of an uploaded embed card thumbnail"),
+    "post_seconds": ("histogram", "Time to create a post (or a batch of posts), including its embed card"),
+    "stage_seconds": ("histogram", "Time spent in each stage of a run"),
+}
+
+
+def _label_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Bucket counts, sum and extremes of the values observed for one histogram and label set
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+    max: float = 0.0
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile from the buckets, interpolating inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+
+# Metrics collects counters and histograms for the run (or, in --daemon mode, the life of the process) and writes
+# them out as a Prometheus textfile (e.g. for node_exporter's textfile collector) and a JSON run summary
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe how long the block takes in the histogram name, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for name in sorted(set(self.counters) | set(self.histograms)):
+                kind, help_text = METRICS.get(name, ("histogram" if name in self.histograms else "counter", ""))
+                full_name = PREFIX + name
+                if help_text:
+                    lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, value in sorted(self.counters.get(name, {}).items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_number(value)}")
+                for key, histogram in sorted(self.histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(key, 'le="' + _format_number(bound) + '"')
+                        lines.append(f"{full_name}_bucket{bucket_labels} {cumulative}")
+                    bucket_labels = _format_labels(key, 'le="+Inf"')
+                    lines.append(f"{full_name}_bucket{bucket_labels} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_number(histogram.total)}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        """Counters and histogram statistics as plain JSON-friendly values."""
+        def series_name(name: str, key: tuple) -> str:
+            return name + _format_labels(key)
+
+        with self.lock:
+            counters = {series_name(name, key): value
+                        for name, series in sorted(self.counters.items()) for key, value in sorted(series.items())}
+            histograms = {series_name(name, key): {
+                                "count": h.count, "sum": round(h.total, 4), "mean": round(h.total / h.count, 4),
+                                "p50": round(h.quantile(0.5), 4), "p95": round(h.quantile(0.95), 4),
+                                "max": round(h.max, 4)}
+                          for name, series in sorted(self.histograms.items()) for key, h in sorted(series.items())}
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_seconds": round(time.time() - self.started_at, 2),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def export(self, textfile_path: str = "", summary_path: str = "") -> None:
+        """Write the Prometheus textfile and append the JSON summary line, for whichever paths are set."""
+        if textfile_path:
+            # node_exporter may read the file at any time, so replace it in one go
+            directory = os.path.dirname(textfile_path) or "."
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(self.to_prometheus())
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, textfile_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        if summary_path:
+            with open(summary_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.summary()) + "\n")
+
+
+def record_llm_usage(metrics: Metrics, purpose: str, response: Any) -> None:
+    """Count the tokens a Gemini generate_content response reports in its usage_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, attribute in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, attribute, None)
+        if count:
+            metrics.inc("llm_tokens_total", count, purpose=purpose, kind=kind)
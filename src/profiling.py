@@ -0,0 +1,85 @@
+from __future__ import annotations
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, TYPE_CHECKING
+if TYPE_CHECKING:
+    import logging
+
+PROFILE_DIR = Path("data/profiles")
+# functions / allocation sites listed in the log for each stage
+TOP_N = 15
+
+
+# StageProfiler profiles each pipeline stage on its own: with cpu, a cProfile .pstats file per stage (open it with
+# `python -m pstats` or snakeviz) and the top functions by cumulative time in the log; with memory, the stage's peak
+# traced memory and the lines that allocated the most while it ran
+class StageProfiler:
+    def __init__(self, logger: logging.Logger, cpu: bool = True, memory: bool = False,
+                 output_dir: Path = PROFILE_DIR, top: int = TOP_N):
+        self.logger = logger
+        self.cpu = cpu
+        self.memory = memory
+        self.output_dir = output_dir
+        self.top = top
+        self.run_id = time.strftime("%Y%m%d-%H%M%S")
+        self.active: str | None = None
+        self.count = 0
+        if cpu:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.active:
+            # a stage inside another one (e.g. a command check between posts) is part of the outer profile
+            yield
+            return
+        self.active = name
+        profile = None
+        before = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        if self.cpu:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            # memory first, so the report does not count the cpu report's own allocations
+            if before is not None:
+                self.__report_memory(name, before, start_memory)
+            if profile is not None:
+                self.__report_cpu(name, profile)
+            self.active = None
+
+    def __report_cpu(self, name: str, profile: cProfile.Profile) -> None:
+        # numbered, since the daemon profiles the same stage again and again
+        self.count += 1
+        path = self.output_dir / f"{self.run_id}-{self.count:03d}-{name}.pstats"
+        profile.dump_stats(path)
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        # drop pstats' header down to the column titles
+        report = stream.getvalue()
+        report = report[report.find("   ncalls"):] if "   ncalls" in report else report
+        self.logger.info(f" Profile of stage '{name}' ({stats.total_tt:.2f}s, saved to {path}):\n{report.rstrip()}")
+
+    def __report_memory(self, name: str, before: tracemalloc.Snapshot, start_memory: int) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        peak -= start_memory
+        after = tracemalloc.take_snapshot()
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        top = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")[:self.top]
+        lines = "\n".join(f"   {stat}" for stat in top)
+        self.logger.info(f" Memory of stage '{name}': peaked {peak / 1024 / 1024:.1f} MiB above its start, biggest allocators:\n{lines}")
@@ -0,0 +1,53 @@
+from __future__ import annotations
+import math
+import time
+import src.tags as tags
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.bsky_post import BskyPost
+    from src.config import Config
+
+# hits beyond this many good words / tags don't make a story any more important
+MAX_COUNTED_HITS = 3
+
+
+def _recency(article: BskyPost, half_life_hours: float, now: float) -> float:
+    published = article.published_epoch
+    if published is None:
+        return 0.5
+    age_hours = max(now - published, 0) / 3600
+    return math.pow(0.5, age_hours / half_life_hours)
+
+
+def score_article(article: BskyPost, config: Config, now: float | None = None) -> float:
+    """Score how urgently an article should be posted. Higher scores are posted first."""
+    weights = config.get_ranking_weights()
+    now = time.time() if now is None else now
+
+    recency = _recency(article, config.get_ranking_half_life_hours(), now)
+    ai_score = article.ai_score if article.ai_score is not None else 0.5
+    good_hits = config.get_keyword_matcher("good_words").count(f"{article.headline} {article.description}")
+    good_hits = min(good_hits, MAX_COUNTED_HITS) / MAX_COUNTED_HITS
+    tag_hits = len(tags.assign_tags_from_keywords(article, config.get_tag_matchers()))
+    tag_hits = min(tag_hits, MAX_COUNTED_HITS) / MAX_COUNTED_HITS
+
+    score = (weights["recency"] * recency
+             + weights["ai_score"] * ai_score
+             + weights["good_words"] * good_hits
+             + weights["tags"] * tag_hits)
+    return score * config.get_source_weight(article.source_name)
+
+
+def rank_articles(articles: list[BskyPost], config: Config) -> list[BskyPost]:
+    """Order articles most important first and cut the list to max_posts_per_run, if set."""
+    now = time.time()
+    scores = {id(article): score_article(article, config, now) for article in articles}
+    ranked = sorted(articles, key=lambda article: scores[id(article)], reverse=True)
+    for article in ranked:
+        config.logger.debug(f"  Rank score {scores[id(article)]:.3f}: {article.headline} ({article.source_name})")
+
+    max_posts = config.get_max_posts_per_run()
+    if max_posts and len(ranked) > max_posts:
+        config.logger.info(f" Posting the top {max_posts} of {len(ranked)} queued articles, the rest stay queued")
+        ranked = ranked[:max_posts]
+    return ranked
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import time
+from typing import Mapping, TYPE_CHECKING
+if TYPE_CHECKING:
+    from src.config import Config
+
+# Bluesky charges record creation against a points budget; each created record costs this many points
+POINTS_PER_POST = 3
+# the endpoints whose ratelimit-* headers describe the posting budget
+WRITE_ENDPOINTS = ("com.atproto.repo.createRecord", "com.atproto.repo.applyWrites")
+# longest stretch of a wait between posts without a between-stages check
+STAGE_CHECK_SECONDS = 5
+
+
+# PostScheduler replaces the fixed delay between posts with a token bucket that is refilled from the
+# ratelimit-remaining / ratelimit-reset headers the PDS sends back on every write
+class PostScheduler:
+    def __init__(self, config: Config):
+        self.config = config
+        self.logger = config.get_logger()
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset_at: float | None = None
+        self.started_at = time.time()
+
+    def start_run(self) -> None:
+        """Start spreading a new backlog from now."""
+        self.started_at = time.time()
+
+    def observe(self, headers: Mapping[str, str] | None) -> None:
+        """Update the bucket from the ratelimit-* headers of a write response."""
+        if not headers:
+            return
+        headers = {key.lower(): value for key, value in headers.items()}
+        try:
+            if "ratelimit-limit" in headers:
+                self.limit = int(headers["ratelimit-limit"])
+            if "ratelimit-remaining" in headers:
+                self.remaining = int(headers["ratelimit-remaining"])
+            if "ratelimit-reset" in headers:
+                self.reset_at = float(headers["ratelimit-reset"])
+        except ValueError:
+            self.logger.debug(f"  Ignoring malformed rate limit headers: {headers}")
+            return
+        self.logger.debug(f"  Rate limit: {self.remaining}/{self.limit} points left, resets in {self.seconds_until_reset():.0f}s")
+
+    def observe_error(self, error: Exception) -> None:
+        """Update the bucket from a failed write, treating a 429 as an empty bucket."""
+        response = getattr(error, "response", None)
+        if response is None:
+            return
+        self.observe(getattr(response, "headers", None))
+        if getattr(response, "status_code", None) == 429:
+            self.remaining = 0
+            self.logger.warning(f"Rate limited by the PDS, backing off for {self.seconds_until_reset():.0f} seconds")
+
+    def seconds_until_reset(self) -> float:
+        if self.reset_at is None:
+            return 0.0
+        return max(self.reset_at - time.time(), 0.0)
+
+    def next_delay(self, posts_left: int, posts_per_request: int = 1) -> float:
+        """Seconds to wait before the next request that creates posts_per_request posts."""
+        cost = POINTS_PER_POST * posts_per_request
+        if self.remaining is None or self.reset_at is None:
+            # no headers seen yet this run
+            delay = float(self.config.get_delay_between_posts_seconds())
+        else:
+            available = self.remaining - self.config.get_rate_limit_reserve_points()
+            window = self.seconds_until_reset()
+            if available < cost:
+                # back off until the window resets instead of running into a 429
+                delay = window + 1
+            elif POINTS_PER_POST * posts_left <= available:
+                # the whole backlog fits in the budget, so only the minimum delay applies
+                delay = 0.0
+            else:
+                # spend what is left of the budget evenly across what is left of the window
+                delay = window * cost / available
+        delay = max(delay, self.config.get_min_delay_between_posts_seconds())
+
+        spread_seconds = self.config.get_spread_backlog_over_seconds()
+        if spread_seconds and posts_left > 0:
+            time_left = self.started_at + spread_seconds - time.time()
+            requests_left = -(-posts_left // posts_per_request)
+            if time_left > 0:
+                delay = max(delay, time_left / requests_left)
+        return delay
+
+    def wait(self, posts_left: int, posts_per_request: int = 1) -> None:
+        delay = self.next_delay(posts_left, posts_per_request)
+        if delay > 0:
+            self.config.logger.info(f"   Waiting {delay:.1f} seconds before next post..")
+            # a stop request cuts the wait short, and long waits still let the daemon check for admin commands
+            deadline = time.monotonic() + delay
+            while ((remaining := deadline - time.monotonic()) > 0 and not self.config.shutdown.is_set()
+                   and not self.config.past_deadline("post")):
+                self.config.shutdown.wait(min(remaining, STAGE_CHECK_SECONDS))
+                self.config.between_stages()
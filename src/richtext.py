@@ -0,0 +1,72 @@
+# richtext turns feed HTML into plain post text and finds the facets (links, mentions, hashtags) Bluesky needs.
+# All patterns are compiled once at import time, and facets are found in a single scan over the UTF-8 bytes of the
+# text so the byte offsets Bluesky expects come straight from the match positions.
+from __future__ import annotations
+import html
+import re
+from typing import NamedTuple
+
+FACET_LINK = "link"
+FACET_MENTION = "mention"
+FACET_TAG = "tag"
+
+# One alternation for all three facet types. The lookbehind keeps the old "[$|\W]" prefix rule (a facet must follow a
+# non-word character) without consuming that character, so back-to-back facets like "#one #two" are both found.
+_FACET_RE = re.compile(
+    rb"(?<=[$|\W])(?:"
+    rb"(?P<link>https?:\/\/(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b(?:[-a-zA-Z0-9()@:%_\+.~#?&//=]*[-a-zA-Z0-9@%_\+~#//=])?)"
+    rb"|(?P<mention>@(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)"
+    rb"|(?P<tag>#[a-zA-Z0-9_]{1,30})"
+    rb")"
+)
+
+_ANCHOR_RE = re.compile(r'(?i)<\s*a\b[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</\s*a\s*>')
+_TAG_RE = re.compile(r'<[^>]+>')
+_BLOCK_OPEN_RE = re.compile(r'(?i)<\s*(?:br|p|div|li|tr|h[1-6])\b[^>]*>')
+_BLOCK_CLOSE_RE = re.compile(r'(?i)</\s*(?:p|div|li|tr|h[1-6])\s*>')
+_NEWLINES_RE = re.compile(r'\n{3,}')
+_SPACES_RE = re.compile(r'[ \t]+')
+
+
+class FacetMatch(NamedTuple):
+    kind: str
+    byte_start: int
+    byte_end: int
+    value: str
+
+
+def find_facets(text: str) -> list[FacetMatch]:
+    """Find every link, mention and hashtag in text, in order, with UTF-8 byte offsets."""
+    text_bytes = text.encode("UTF-8")
+    facets = []
+    for m in _FACET_RE.finditer(text_bytes):
+        kind = m.lastgroup
+        value = m.group(kind).decode("UTF-8")
+        if kind == FACET_MENTION:
+            value = value[1:]  # handle without the leading @
+        facets.append(FacetMatch(kind, m.start(kind), m.end(kind), value))
+    return facets
+
+
+def strip_tags(text: str) -> str:
+    """Remove every HTML tag from text."""
+    return _TAG_RE.sub('', text)
+
+
+def _replace_anchor(m: re.Match) -> str:
+    return f"{strip_tags(m.group(2) or '')} ({m.group(1)})"
+
+
+def html_to_text(text: str) -> str:
+    """Convert an HTML snippet from a feed into plain text suitable for a post."""
+    text = html.unescape(text)
+    # <a href="...">text</a> => "text (url)"
+    text = _ANCHOR_RE.sub(_replace_anchor, text)
+    # block-level tags become newlines, their closing tags and everything else disappear; plain string replacements
+    # keep these substitutions in C, a Python callback per tag is slower than the extra passes
+    text = _BLOCK_OPEN_RE.sub('\n', text)
+    text = _BLOCK_CLOSE_RE.sub('', text)
+    text = _TAG_RE.sub('', text)
+    text = text.replace('\r', '')
+    text = _NEWLINES_RE.sub('\n', text)
+    return _SPACES_RE.sub(' ', text).strip()
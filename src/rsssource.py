@@ -1,14 +1,25 @@
 from __future__ import annotations
-import feedparser
-import datetime
+import calendar
+import gzip
+import itertools
 import logging
+import time
+import urllib.request
+import zlib
 
+import src.fastfeed as fastfeed
+import src.timestamps as timestamps
 from src.bsky_post import BskyPost
-from typing import TYPE_CHECKING
+from src.fastfeed import FeedEntry
+from src.metrics import SIZE_BUCKETS
+from typing import Iterator, TYPE_CHECKING
 if TYPE_CHECKING:
+    from src.circuitbreaker import SourceCircuitBreaker
     from src.config import Config
     from feedparser import FeedParserDict
 
+# feedparser's own User-Agent, which feeds have been seeing all along, without importing feedparser for it
+FEED_USER_AGENT = "feedparser/6.0.12 +https://github.com/kurtmckee/feedparser/"
 # RSS_Source handles parsing news articles from RSS feeds
 class RSS_Source():
     def __init__(self, name: str, url: str, tag: str, config: Config):
@@ -17,88 +28,178 @@ class RSS_Source():
         self._tag = tag
         self._db = config.db
         self._config = config
-
-    def get_articles(self, max_age: int) -> list[BskyPost]:
-        return self.parse_rss(max_age)
-
-    def parse_rss(self, max_age: int) -> list[BskyPost]:
+        # publication times (unix seconds) of every entry in the feed at the last fetch, for adaptive polling
+        self.entry_times: list[int] = []
+        self.fetched = False
+        self.error = ""
+
+    def get_articles(self, max_age: int, limit: int | None = None) -> list[BskyPost]:
+        # stops reading the feed as soon as it has limit new articles
+        return list(itertools.islice(self.parse_rss(max_age), limit))
+
+    # downloads the feed ourselves rather than letting feedparser do it, so download and parse time (and the size) can
+    # be measured separately
+    def fetch(self, agent: str) -> tuple[bytes, dict[str, str]]:
+        request = urllib.request.Request(self._url, headers={"User-Agent": agent, "Accept-Encoding": "gzip, deflate"})
+        with urllib.request.urlopen(request) as response:
+            content = response.read()
+            headers = {key.lower(): value for key, value in response.headers.items()}
+            # relative links in the feed resolve against where it was actually served from
+            headers["content-location"] = response.geturl()
+        self._config.metrics.observe("fetch_bytes", len(content), SIZE_BUCKETS, source=self._name)
+        encoding = headers.pop("content-encoding", "")
+        headers.pop("content-length", None)
+        if encoding == "gzip":
+            content = gzip.decompress(content)
+        elif encoding == "deflate":
+            try:
+                content = zlib.decompress(content)
+            except zlib.error:
+                content = zlib.decompress(content, -zlib.MAX_WBITS)
+        return content, headers
+
+    # downloads and parses the feed right away, the articles are built as the iterator is read
+    def parse_rss(self, max_age: int) -> Iterator[BskyPost]:
+        metrics = self._config.metrics
         try:
-            feed = feedparser.parse(self._url)
-        except Exception:
+            with metrics.timer("fetch_seconds", source=self._name):
+                content, headers = self.fetch(FEED_USER_AGENT)
+            with metrics.timer("parse_seconds", source=self._name):
+                entries = self.parse_entries(content, headers)
+        except OSError as e:
+            # HTTP errors, timeouts and bad gzip data
+            logging.warning(f"Failed to download RSS feed {self._name}: {e}")
+            metrics.inc("fetch_errors_total", source=self._name)
+            self.error = str(e)
+            return iter(())
+        except Exception as e:
             logging.exception(f"Failed to parse RSS feed {self._name}")
-            return []
-
-        articles: list[BskyPost] = []
+            metrics.inc("fetch_errors_total", source=self._name)
+            self.error = str(e)
+            return iter(())
+
+        self.fetched = True
+        # every entry's date is read up front, not as the articles are streamed: adaptive polling needs the dates of
+        # the whole feed, and new_articles checks they are in order. Only the database lookups and BskyPosts are lazy.
+        self.entry_times = [entry.published_epoch for entry in entries if entry.published_epoch is not None]
+        return self.new_articles(entries, max_age)
+
+    # plain RSS 2.0 and Atom feeds go through the streaming parser, anything it doesn't handle through feedparser
+    def parse_entries(self, content: bytes, headers: dict[str, str]) -> list[FeedEntry]:
+        entries = fastfeed.parse_feed(content, headers.get("content-location", ""))
+        if entries is not None:
+            return entries
+        self._config.metrics.inc("feed_parser_fallbacks_total", source=self._name)
+        import feedparser
+        from feedparser import FeedParserDict
+        feed = feedparser.parse(content, response_headers=headers)
         if not feed.entries or not isinstance(feed.entries, list):
             return []
-        
-        from feedparser import FeedParserDict
-        for entry in feed.entries:
-            if not entry or not isinstance(entry, FeedParserDict):
+        dates = timestamps.DateParser()
+        return [_from_feedparser(entry, dates) for entry in feed.entries if entry and isinstance(entry, FeedParserDict)]
+
+    def new_articles(self, entries: list[FeedEntry], max_age: int) -> Iterator[BskyPost]:
+        """Articles for the entries that are recent enough and not posted, excluded or queued yet, in feed order."""
+        metrics = self._config.metrics
+        now = int(time.time())
+        cutoff = now - max_age * 86400 if max_age is not None and max_age > 0 else None
+        # in a feed that lists every entry newest first, nothing after the first entry that is too old can be new enough
+        published = [entry.published_epoch for entry in entries]
+        newest_first = all(epoch is not None for epoch in published) and all(
+            a >= b for a, b in zip(published, published[1:]))
+        for entry in entries:
+            if cutoff is not None and entry.published_epoch is not None and entry.published_epoch < cutoff:
+                if newest_first:
+                    return
                 continue
 
-            link = str(entry.link)
-            if self._db.has_posted_article(link) or self._db.is_excluded(link):
+            link = entry.link
+            metrics.inc("db_lookups_total")
+            with metrics.timer("db_lookup_seconds"):
+                seen = self._db.has_posted_article(link) or self._db.is_excluded(link) or self._db.is_queued(link)
+            if seen:
                 continue
 
-            # skip if article older than configured max age
-
-            if max_age is not None and max_age > 0:
-                published_dt = None
-                if getattr(entry, "published_parsed", None):
-                    published_dt = datetime.datetime(*entry.published_parsed[:6]) # type: ignore
-                elif getattr(entry, "published", None):
-                    try:
-                        published_dt = datetime.datetime.fromisoformat(str(entry.published))
-                    except Exception:
-                        try:
-                            published_dt = datetime.datetime.strptime(str(entry.published), "%a, %d %b %Y %H:%M:%S %Z")
-                        except Exception:
-                            published_dt = None
-
-                if published_dt:
-                    if (datetime.datetime.now() - published_dt) > datetime.timedelta(days=int(max_age)):
-                        continue
-
             img_url = ""
-            if entry.get("enclosures") and len(entry.enclosures) > 0:
-                enc_url = entry.enclosures[0].href
-                if any(ext in str(enc_url).lower() for ext in ["jpg", "jpeg", "png", "gif"]):
-                    img_url = enc_url
+            if any(ext in entry.enclosure_url.lower() for ext in ["jpg", "jpeg", "png", "gif"]):
+                img_url = entry.enclosure_url
 
-            article = BskyPost(
+            yield BskyPost(
                 source_name=self._name,
-                headline=str(entry.title),
-                description=str(entry.description),
-                link=str(entry.link),
-                img_url=str(img_url),
-                created_at=str(entry.published) if entry.published else datetime.datetime.now().isoformat(),
+                headline=entry.title,
+                description=entry.description,
+                link=link,
+                img_url=img_url,
+                created_at=entry.published or timestamps.format_timestamp(now),
+                published_epoch=entry.published_epoch,
                 tag=self._tag,
                 config = self._config
             )
-            articles.append(article)
-        return articles
-    
+
+
+# The fields the bot uses from a feedparser entry
+def _from_feedparser(entry: FeedParserDict, dates: timestamps.DateParser) -> FeedEntry:
+    enclosures = entry.get("enclosures") or []
+    return FeedEntry(
+        title=str(entry.get("title", "")),
+        link=str(entry.get("link", "")),
+        description=str(entry.get("description", "")),
+        published=str(entry.get("published", "") or entry.get("updated", "") or ""),
+        published_epoch=_entry_epoch(entry, dates),
+        enclosure_url=str(enclosures[0].get("href", "")) if enclosures else "",
+    )
+
+
+# The publication time of a feed entry in unix seconds, or None if it has none that can be read
+def _entry_epoch(entry: FeedParserDict, dates: timestamps.DateParser) -> int | None:
+    published_parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if published_parsed:
+        # feedparser's parsed times are UTC
+        return calendar.timegm(published_parsed)
+    return dates.parse(str(entry.get("published", "") or entry.get("updated", "") or ""))
+
 # Parse RSS feeds from config and return list of PostableArticle
-def get_rss_feeds(config: Config) -> list[BskyPost]: # type: ignore
+def get_rss_feeds(config: Config, breaker: SourceCircuitBreaker | None = None) -> list[BskyPost]: # type: ignore
     # from src.config import Config # This import is not needed here due to the type hint 'Config'
 
+    scheduler = None
+    if config.get_adaptive_feed_polling():
+        from src.feedschedule import FeedScheduler
+        scheduler = FeedScheduler(config)
+
     feeds = []
-    rss_feeds = config.get_rss_feeds()
-    for _, feed_info in rss_feeds.items():
-        feeds.append(RSS_Source(feed_info["name"], feed_info["url"], feed_info["tag"], config))
+    for source in config.get_rss_feeds():
+        if scheduler and not scheduler.is_due(source):
+            continue
+        feeds.append((source, RSS_Source(source.name, source.url, source.tag, config)))
+    if scheduler:
+        config.logger.info(f" Polling {len(feeds)} of {len(config.get_rss_feeds())} RSS feeds, the others are not due yet.")
 
     articles = []
-
-    for feed in feeds:
-        feed_articles = feed.get_articles(config.max_article_age_days())
-
-        # keep only the first x articles
-        if feed_articles:
-            feed_articles = feed_articles[:config.get_max_articles_per_feed()]
+    settings = config.get_settings()
+
+    for source, feed in feeds:
+        # feeds not fetched now are fetched next run, nothing is lost
+        if config.past_deadline("fetch"):
+            break
+        if breaker and not breaker.allow(source):
+            continue
+        feed_articles = feed.get_articles(settings.max_article_age_days, settings.max_articles_per_feed)
+        if scheduler:
+            if feed.fetched:
+                scheduler.record_poll(source, feed.entry_times)
+            else:
+                scheduler.record_failure(source)
+        if breaker:
+            if feed.fetched:
+                breaker.record_success(source)
+            else:
+                breaker.record_failure(source, feed.error)
 
         articles.extend(feed_articles)
         config.logger.debug(f"Fetched {len(feed_articles)} articles from RSS feed: {feed._name}")
 
+    if scheduler:
+        scheduler.save()
     config.logger.info(f" Fetched {len(articles)} articles from RSS feeds.")
     return articles
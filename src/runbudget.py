@@ -0,0 +1,76 @@
+from __future__ import annotations
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, TYPE_CHECKING
+if TYPE_CHECKING:
+    import logging
+
+LOCK_DIR = Path("data")
+# what a run leaves out once it is past each stage's soft deadline
+DEGRADATIONS = {
+    "fetch": "not fetching the remaining sources",
+    "filter": "leaving the articles not yet rated for the next run",
+    "summaries": "posting without AI summaries",
+    "thumbnails": "posting without thumbnails",
+    "post": "leaving the rest of the outbox for the next run",
+}
+
+
+# RunBudget bounds how long a single run takes, so a cron run is done before the next one starts. Each stage has a
+# soft deadline, a share of the budget: once it has passed, the run drops that stage's optional work (see
+# DEGRADATIONS) rather than stopping in the middle of something. Whatever is left over stays queued, or unseen, for
+# the next run.
+class RunBudget:
+    def __init__(self, seconds: float, deadlines: Dict[str, float], logger: logging.Logger):
+        self.seconds = seconds
+        self.deadlines = deadlines
+        self.logger = logger
+        self.start = time.monotonic()
+        self.passed: set[str] = set()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def past(self, stage: str) -> bool:
+        """Whether the run is past the soft deadline of a stage, logging it the first time."""
+        if stage in self.passed:
+            return True
+        if self.elapsed() < self.seconds * self.deadlines[stage]:
+            return False
+        self.passed.add(stage)
+        self.logger.warning(f" {self.elapsed():.0f}s into a {self.seconds:.0f}s run budget, past the {stage} deadline: "
+                            f"{DEGRADATIONS[stage]}.")
+        return True
+
+
+@contextmanager
+def run_lock(names: list[str], lock_dir: Path = LOCK_DIR) -> Iterator[bool]:
+    """Hold data/<name>.lock for each name for the duration, or yield False if another process holds one of them."""
+    try:
+        import fcntl
+    except ImportError:
+        # no flock on Windows, runs are not protected from each other there
+        yield True
+        return
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    try:
+        for name in names:
+            f = open(lock_dir / f"{name}.lock", "a+")
+            files.append(f)
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            # for whoever looks at the file, the lock itself is the flock
+            f.truncate(0)
+            f.write(f"{os.getpid()}\n")
+            f.flush()
+        yield True
+    finally:
+        # closing the files releases the locks
+        for f in files:
+            f.close()
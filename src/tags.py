@@ -2,22 +2,21 @@ from __future__ import annotations
 from typing import Dict, TYPE_CHECKING
 if TYPE_CHECKING:
     from src.bsky_post import BskyPost
+    from src.keywords import KeywordMatcher
 
-def _assign_tags_from_keywords(article: BskyPost, tags_config: Dict[str, list[str]]) -> list[str]: 
+def assign_tags_from_keywords(article: BskyPost, tag_matchers: Dict[str, KeywordMatcher]) -> list[str]: 
     assigned_tags = []
     article_text = f"{article.headline} {article.description} {article.link}".replace("\n", " ")
     article_text = article_text.replace("-", " ").replace("_", " ").replace("/", " ").replace(".", " ").replace(",", " ").replace(":", " ").lower()
 
-    for tag, keywords in tags_config.items():
-        for keyword in keywords:
-            if keyword.lower() in article_text:
-                assigned_tags.append(tag)
-                break  # No need to check other keywords for this tag
+    for tag, matcher in tag_matchers.items():
+        if matcher.matches(article_text):
+            assigned_tags.append(tag)
 
     return assigned_tags
 
-def add_tags_to_post(article: BskyPost, tags_config: Dict[str, list[str]]) -> tuple[str, str]:
-    tags = _assign_tags_from_keywords(article, tags_config)
+def add_tags_to_post(article: BskyPost, tag_matchers: Dict[str, KeywordMatcher]) -> tuple[str, str]:
+    tags = assign_tags_from_keywords(article, tag_matchers)
     tags.append(article.tag)  # Include the tag of the source
     post_text = article.get_post_text()
     if not tags:
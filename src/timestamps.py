@@ -0,0 +1,104 @@
+from __future__ import annotations
+import datetime
+import email.utils
+import re
+from typing import Callable
+
+# Publication dates come in whatever format a feed or website uses. Everything is normalized to whole unix seconds
+# (UTC) once, when an article is read, so age filtering, ranking and latency reports compare integers. Dates without
+# a time zone are taken to be UTC, as email.utils does for RSS dates.
+
+# [weekday,] day month year time: parsedate_tz also takes "January 5, 2026 10:30 PM" but reads it as 10:30 AM, so
+# only dates of this shape are given to it
+_RFC822_RE = re.compile(r"(?:[A-Za-z]+,?\s*)?\d{1,2}\s+[A-Za-z]{3}\s+\d{2,4}\s+\d{1,2}:\d{2}(?::\d{2})?"
+                         r"(?:\s+(?![AaPp][Mm]$)\S+)?")
+
+
+def _rfc822(value: str) -> int | None:
+    # "Mon, 05 Jan 2026 10:00:00 -0500", the RSS format; parsedate_tz is much cheaper than a datetime round trip
+    if not _RFC822_RE.fullmatch(value):
+        return None
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if parsed[9] is None:
+        parsed = parsed[:9] + (0,)
+    return int(email.utils.mktime_tz(parsed))
+
+
+def _iso(value: str) -> int | None:
+    # "2026-01-05T10:00:00Z", the Atom format, and the ISO dates websites use
+    try:
+        return from_datetime(datetime.datetime.fromisoformat(value))
+    except ValueError:
+        return None
+
+
+def _strptime(fmt: str) -> Callable[[str], int | None]:
+    def parse(value: str) -> int | None:
+        try:
+            return from_datetime(datetime.datetime.strptime(value, fmt))
+        except ValueError:
+            return None
+    return parse
+
+
+# tried in this order to recognise a format, the common ones first
+PARSERS: tuple[Callable[[str], int | None], ...] = (
+    _rfc822,
+    _iso,
+    _strptime("%Y-%m-%d %H:%M:%S %z"),
+    _strptime("%B %d, %Y %I:%M %p"),
+    _strptime("%B %d, %Y"),
+    _strptime("%m/%d/%Y %H:%M:%S"),
+    _strptime("%m/%d/%Y"),
+)
+
+
+# DateParser reads the dates of one feed. The format is recognised from the first date and that parser is tried first
+# for the rest, so a feed costs one format detection rather than a cascade of attempts per entry.
+class DateParser:
+    def __init__(self):
+        self.parser: Callable[[str], int | None] | None = None
+
+    def parse(self, value: str) -> int | None:
+        """The date as unix seconds, or None if it is empty or in no format known here."""
+        value = value.strip()
+        if not value:
+            return None
+        if self.parser is not None:
+            epoch = self.parser(value)
+            if epoch is not None:
+                return epoch
+        # the first date, or a feed that mixes formats
+        for parser in PARSERS:
+            if parser is not self.parser and (epoch := parser(value)) is not None:
+                self.parser = parser
+                return epoch
+        return None
+
+
+def parse_timestamp(value: str) -> int | None:
+    """
+    A single date as unix seconds, or None if it can't be read. Check with python3 -m doctest src/timestamps.py
+
+    >>> parse_timestamp("Mon, 05 Jan 2026 22:30:00 +0000"), parse_timestamp("2026-01-05T17:30:00-05:00")
+    (1767652200, 1767652200)
+    >>> parse_timestamp("January 5, 2026 10:30 PM"), parse_timestamp("January 5, 2026 10:30 AM")
+    (1767652200, 1767609000)
+    >>> parse_timestamp("whenever") is None
+    True
+    """
+    return DateParser().parse(value)
+
+
+def from_datetime(dt: datetime.datetime) -> int:
+    """A datetime as unix seconds, naive ones in UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+
+def format_timestamp(epoch: int) -> str:
+    """Unix seconds as an RFC 822 date in UTC, the format RSS uses."""
+    return email.utils.formatdate(epoch, usegmt=True)